@@ -0,0 +1,108 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+
+Seeded generators of synthetic coaching graphs, for the benchmarks.
+Each generator returns a list of (coach, coachee) pairs of user numbers in range(size), the same seed always
+gives the same graph. buildGraph turns them into a CoachingGraph.
+'''
+import random
+from models.user_graph import CoachingGraph, User
+
+
+def classrooms(size, seed=0, classSize=30, sharedCoachRate=0.05):
+    '''
+    wide, shallow trees: one coach per classroom of classSize, with a few coaches also coaching
+    a student in an earlier classroom, which joins some classrooms into larger components
+    '''
+    generator = random.Random(seed)
+    pairs = []
+    for coach in range(0, size, classSize):
+        pairs.extend((coach, student) for student in range(coach + 1, min(coach + classSize, size)))
+        if coach > 0 and generator.random() < sharedCoachRate:
+            pairs.append((coach, generator.randrange(coach)))
+    return pairs
+
+
+def powerLaw(size, seed=0, newTreeRate=0.001):
+    '''
+    Coach fan-out follows a power law: every user picks a coach among the earlier users by preferential attachment,
+    so a user that already coaches k users is k + 1 times as likely to be picked. With probability newTreeRate
+    a user starts a new tree instead.
+    '''
+    generator = random.Random(seed)
+    pairs = []
+    candidates = [0]    #every user once, plus once more per coachee
+    for coachee in range(1, size):
+        if generator.random() >= newTreeRate:
+            coach = generator.choice(candidates)
+            pairs.append((coach, coachee))
+            candidates.append(coach)
+        candidates.append(coachee)
+    return pairs
+
+
+def manyCoaches(size, seed=0, coachesPerUser=5, coachShare=0.1):
+    '''
+    the first coachShare of the users are coaches, every other user is coached by coachesPerUser of them
+    '''
+    generator = random.Random(seed)
+    coachCount = max(1, int(size * coachShare))
+    pairs = [(generator.randrange(coach), coach) for coach in range(1, coachCount)]
+    for coachee in range(coachCount, size):
+        pairs.extend((coach, coachee) for coach in generator.sample(range(coachCount), min(coachesPerUser, coachCount)))
+    return pairs
+
+
+def chains(size, seed=0, length=1000):
+    '''
+    long coaching chains of length users, the users are numbered in random order so a chain is not a run of slots
+    '''
+    generator = random.Random(seed)
+    order = list(range(size))
+    generator.shuffle(order)
+    return [(order[i - 1], order[i]) for i in range(1, size) if i % length]
+
+
+def rootlessCycles(size, seed=0, minCycle=2, maxCycle=5, chordRate=0.1):
+    '''
+    every user is in a mutual-coaching loop of minCycle to maxCycle users, so no user lacks a coach,
+    with an occasional extra relationship inside a loop
+    '''
+    generator = random.Random(seed)
+    pairs = []
+    start = 0
+    while start < size:
+        end = min(size, start + generator.randint(minCycle, maxCycle))
+        if end - start < 2:    #a single user left over joins the previous loop
+            pairs.append((start - 1, start))
+            pairs.append((start, start - 1))
+            break
+        pairs.extend((user, user + 1) for user in range(start, end - 1))
+        pairs.append((end - 1, start))
+        if end - start > 2 and generator.random() < chordRate:
+            pairs.append((start, end - 2))
+        start = end
+    return pairs
+
+
+SHAPES = {
+    'classrooms': classrooms,
+    'powerLaw': powerLaw,
+    'manyCoaches': manyCoaches,
+    'chains': chains,
+    'rootlessCycles': rootlessCycles,
+    }
+
+
+def buildGraph(size, pairs, version=1.0):
+    '''
+    returns (graph, users), users being the User for each user number
+    '''
+    graph = CoachingGraph()
+    users = [User(str(number), version) for number in range(size)]
+    graph.addUsers(users)
+    graph.addCoachingRelationships([(users[coach].UUID, users[coachee].UUID) for coach, coachee in pairs])
+    return graph, users
+
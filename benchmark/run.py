@@ -0,0 +1,195 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+
+Times the public CoachingGraph methods on synthetic graphs (see benchmark.generators) and writes the results
+as JSON, so runs on different versions can be compared:
+
+    python -m benchmark.run --sizes 1000 100000 --output new.json
+    python -m benchmark.run --compare old.json new.json
+'''
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from itertools import count
+from multiprocessing import Pool
+from time import perf_counter
+from benchmark.generators import SHAPES, buildGraph
+
+try:
+    import resource
+except ImportError: #not available on Windows
+    resource = None
+
+
+FORMAT_VERSION = 1
+DEFAULT_SIZES = [10**3, 10**4, 10**5]   #up to 10**7 can be asked for, given the memory
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.2
+
+
+def runCase(shape, size, seed=0, repeats=DEFAULT_REPEATS, memory=False):
+    '''
+    Builds one graph and times every method on it. Returns a list of result dicts with the shape, size, seed,
+    relationship count, method, the seconds of every repeat, the best of them, the peak bytes traced by
+    tracemalloc during one extra run (if memory) and for getSpanningTree the traversal counters of InfectionStats.
+    '''
+    generator = random.Random(seed)
+    pairs = SHAPES[shape](size, seed)
+    versions = count(2)
+    results = []
+    def record(method, seconds, peakMemory=None, counters=None):
+        results.append({
+            'shape': shape, 'size': size, 'seed': seed, 'relationships': len(pairs), 'method': method,
+            'seconds': seconds, 'best': min(seconds), 'peakMemory': peakMemory, 'counters': counters,
+            })
+
+    built = []
+    record('build', *_measure(lambda: built.append(buildGraph(size, pairs)), repeats, memory))
+    graph, users = built[-1]
+    del built[:]
+    seedID = users[generator.randrange(size)].UUID
+    target = max(1, size // 10)
+
+    record('total_infection', *_measure(lambda: graph.total_infection(seedID, next(versions)), repeats, memory))
+
+    phaseSeconds = {}
+    stats = graph.instrument(hook=lambda phase, seconds, counters: phaseSeconds.setdefault(phase, []).append(seconds))
+    def rebuild():
+        graph.generation += 1  #makes updateSpanningTree rebuild instead of using the cached tree
+        graph.updateSpanningTree()
+    record('updateSpanningTree', *_measure(rebuild, repeats, memory))
+    spanningStats = stats['getSpanningTree']
+    record('getSpanningTree', phaseSeconds['getSpanningTree'][:repeats],
+           counters={name: getattr(spanningStats, name) // spanningStats.calls for name in ('nodesVisited', 'queuePushes', 'cycleRounds')})
+    record('setSubtreeSizes', phaseSeconds['setSubtreeSizes'][:repeats])
+    graph.uninstrument()
+
+    def selectSubtree():
+        graph.sizeIndex = None #time the selection from cold, including the size index
+        return graph.selectSubtree(target)
+    record('selectSubtree', *_measure(selectSubtree, repeats, memory))
+    rootID = graph.selectSubtree(target)
+    record('infectSubtree', *_measure(lambda: graph.infectSubtree(next(versions), rootID), repeats, memory))
+    def limitedInfection():
+        graph.generation += 1
+        graph.limited_infection(next(versions), target)
+    record('limited_infection', *_measure(limitedInfection, repeats, memory))
+
+    compiled = []
+    record('compile', *_measure(lambda: compiled.append(graph.compile()), repeats, memory))
+    compiled = compiled[-1]
+    record('compiled.total_infection', *_measure(lambda: compiled.total_infection(seedID, next(versions)), repeats, memory))
+    record('compiled.preprocess', *_measure(compiled.preprocess, repeats, memory))
+
+    if resource is not None:
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for result in results:
+            result['maxRss'] = maxRss
+    return results
+
+
+def _measure(function, repeats, memory):
+    '''
+    returns (seconds of each repeat, peak traced bytes of one more run or None)
+    '''
+    seconds = []
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        seconds.append(perf_counter() - start)
+    peakMemory = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peakMemory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peakMemory
+
+
+def _runCase(arguments):
+    return runCase(*arguments)
+
+
+def run(shapes, sizes, seed=0, repeats=DEFAULT_REPEATS, memory=False, isolate=False, progress=None):
+    '''
+    Runs every shape at every size and returns the results document.
+    With isolate every case runs in a fresh process, so maxRss is the peak of that case alone.
+    progress, if given, is called with (shape, size) before each case.
+    '''
+    results = []
+    pool = Pool(1, maxtasksperchild=1) if isolate else None
+    try:
+        for size in sizes:
+            for shape in shapes:
+                if progress: progress(shape, size)
+                arguments = (shape, size, seed, repeats, memory)
+                results.extend(pool.apply(_runCase, (arguments,)) if pool else runCase(*arguments))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'isolated': isolate,
+        'results': results,
+        }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Returns the regressions between two results documents, as (shape, size, method, baselineBest, currentBest)
+    for every case where the current best time is more than tolerance (a fraction) slower than the baseline
+    '''
+    baselineBest = {(result['shape'], result['size'], result['method']): result['best'] for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['shape'], result['size'], result['method'])
+        if key in baselineBest and result['best'] > baselineBest[key] * (1 + tolerance):
+            regressions.append(key + (baselineBest[key], result['best']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the coaching graph on synthetic graphs.')
+    parser.add_argument('--shapes', nargs='+', choices=sorted(SHAPES), default=sorted(SHAPES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--memory', action='store_true', help='also trace the peak memory of each method (slow)')
+    parser.add_argument('--isolate', action='store_true', help='run each case in a fresh process')
+    parser.add_argument('--output', help='file to write the JSON results to, standard output by default')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two results files instead of running, exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    arguments = parser.parse_args(argv)
+
+    if arguments.compare:
+        with open(arguments.compare[0]) as baselineFile, open(arguments.compare[1]) as currentFile:
+            regressions = compare(json.load(baselineFile), json.load(currentFile), arguments.tolerance)
+        for shape, size, method, baselineBest, currentBest in regressions:
+            print('{} {} {}: {:.4f}s -> {:.4f}s'.format(shape, size, method, baselineBest, currentBest))
+        return 1 if regressions else 0
+
+    document = run(arguments.shapes, arguments.sizes, arguments.seed, arguments.repeats, arguments.memory,
+                   arguments.isolate, progress=lambda shape, size: print(shape, size, file=sys.stderr))
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            json.dump(document, outputFile, indent=1)
+    else:
+        json.dump(document, sys.stdout, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from array import array
+
+
+class ComponentIndex(object):
+    '''
+    Connected components of the coaching graph, ignoring edge direction, kept up to date as
+    users and relationships are added, and split when removals disconnect them.
+    Users are identified by their UserStore slot.
+
+    Every slot points straight at the label of its component, so find is a single read. A union relabels the
+    smaller of the two components, which costs O(log slots) per slot over any sequence of unions, as a slot's
+    component at least doubles each time it is relabelled. The members of each component are chained into a
+    circular doubly linked list (self.nextMember, self.prevMember): a union splices two rings together in O(1),
+    listing a component costs O(its size) with no traversal, and a split unlinks only the slots it moves, so it
+    costs O(the piece split off) whatever the size of the component it leaves.
+
+    self.label is an int array of slot:label of its component
+    self.sizes is an int array of label:component size, 0 for a label not in use
+    self.anchor is an int array of label:a slot of that component, where roots() and members() start
+    self.nextMember, self.prevMember are int arrays of slot:next, previous slot in the same component
+    self.freeLabels is a list of the labels not in use
+    '''
+
+
+    def __init__(self):
+        self.label = array('i')
+        self.sizes = array('i')
+        self.anchor = array('i')
+        self.nextMember = array('i')
+        self.prevMember = array('i')
+        self.freeLabels = []
+
+    def _newLabel(self, anchor, size):
+        if self.freeLabels:
+            label = self.freeLabels.pop()
+            self.sizes[label], self.anchor[label] = size, anchor
+        else:
+            label = len(self.sizes)
+            self.sizes.append(size)
+            self.anchor.append(anchor)
+        return label
+
+    def add(self, slot):
+        '''
+        slots are handed out densely by the UserStore, so a new one is always the next index
+        '''
+        assert slot == len(self.label)
+        self.label.append(self._newLabel(slot, 1))
+        self.nextMember.append(slot)
+        self.prevMember.append(slot)
+
+    def find(self, slot):
+        return self.label[slot]
+
+    def union(self, slotA, slotB):
+        labelA, labelB = self.label[slotA], self.label[slotB]
+        if labelA == labelB:
+            return labelA
+        if self.sizes[labelA] < self.sizes[labelB]:
+            labelA, labelB = labelB, labelA
+        label = self.label
+        for member in self.members(self.anchor[labelB]):
+            label[member] = labelA
+        nextMember, prevMember = self.nextMember, self.prevMember
+        anchorA, anchorB = self.anchor[labelA], self.anchor[labelB]
+        afterA, afterB = nextMember[anchorA], nextMember[anchorB]
+        nextMember[anchorA], prevMember[afterB] = afterB, anchorA
+        nextMember[anchorB], prevMember[afterA] = afterA, anchorB
+        self.sizes[labelA] += self.sizes[labelB]
+        self.sizes[labelB] = 0
+        self.freeLabels.append(labelB)
+        return labelA
+
+    def split(self, part):
+        '''
+        Makes part, a list of slots of one component that are no longer connected to the rest of it, a component
+        of its own. The rest keeps its label. O(len(part)), nothing outside part is read except its ring neighbours
+        '''
+        label, nextMember, prevMember = self.label, self.nextMember, self.prevMember
+        oldLabel = label[part[0]]
+        if self.sizes[oldLabel] == len(part):
+            return  #already a component of its own
+        newLabel = self._newLabel(part[0], len(part))
+        self.sizes[oldLabel] -= len(part)
+        for member in part:
+            label[member] = newLabel
+            before, after = prevMember[member], nextMember[member]
+            nextMember[before], prevMember[after] = after, before
+        if label[self.anchor[oldLabel]] != oldLabel:
+            self.anchor[oldLabel] = after   #the ring neighbour of the last slot unlinked is one that stays
+        for member, nextSlot in zip(part, part[1:] + part[:1]):
+            nextMember[member], prevMember[nextSlot] = nextSlot, member
+
+    def renumbered(self, newSlots):
+        '''
+        A copy with every slot moved to newSlots[slot], see UserStore.compacted. The slots dropped (-1) must be
+        components of their own, as removed users are, so every ring left only holds slots that are kept. O(slots)
+        '''
+        componentIndex = ComponentIndex()
+        kept = [slot for slot in range(len(self.label)) if newSlots[slot] >= 0]
+        newLabels = {}  #dict of old label:new label, handed out in order of the components' first kept slot
+        for slot in kept:
+            oldLabel = self.label[slot]
+            if oldLabel not in newLabels:
+                newLabels[oldLabel] = len(newLabels)
+                componentIndex.sizes.append(self.sizes[oldLabel])
+                componentIndex.anchor.append(newSlots[self.anchor[oldLabel]])
+        componentIndex.label = array('i', (newLabels[self.label[slot]] for slot in kept))
+        componentIndex.nextMember = array('i', (newSlots[self.nextMember[slot]] for slot in kept))
+        componentIndex.prevMember = array('i', (newSlots[self.prevMember[slot]] for slot in kept))
+        return componentIndex
+
+    def size(self, slot):
+        return self.sizes[self.label[slot]]
+
+    def members(self, slot):
+        '''
+        yields every slot in the same component as slot, starting with slot itself
+        '''
+        nextMember = self.nextMember
+        current = slot
+        while True:
+            yield current
+            current = nextMember[current]
+            if current == slot:
+                break
+
+    def roots(self):
+        '''
+        one slot of each component, its anchor
+        '''
+        sizes, anchor = self.sizes, self.anchor
+        return (anchor[label] for label in range(len(sizes)) if sizes[label])
+
+
+def sourceComponentRoots(nodes, successors):
+    '''
+    Finds the strongly connected components of a directed graph with an iterative Tarjan search and returns
+    one node from each source component, i.e. each component that no edge enters from outside it.
+    Every node can be reached from one of the returned nodes, and none of them from another.
+
+    nodes is every node of the graph, successors(node) the nodes it has edges to. The nodes are returned in
+    the order of nodes, each being the first node of its component in that order. O(nodes + edges).
+    '''
+    index = {}      #dict of node:order of discovery
+    low = {}        #dict of node:lowest discovery order reachable through the nodes still on the stack
+    component = {}  #dict of node:component number, once its component is complete
+    entered = []    #component number:whether an edge enters it from another component
+    stack = []
+    candidates = [] #(node, component number) of components found from the outer loop rather than through an edge
+    for start in nodes:
+        if start in index:
+            continue
+        index[start] = low[start] = len(index)
+        stack.append(start)
+        work = [(start, iter(successors(start)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in component:
+                    entered[component[child]] = True
+                elif index[child] < low[node]:    #still on the stack, so in the same component as node
+                    low[node] = index[child]
+            else:
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]:
+                    number = len(entered)
+                    entered.append(bool(work))  #reached through an edge from the node below it on the work stack
+                    while True:
+                        member = stack.pop()
+                        component[member] = number
+                        if member == node:
+                            break
+                    if not work:
+                        candidates.append((node, number))
+    return [node for node, number in candidates if not entered[number]]
+
+
+def limitWalk(walk, maxUsers, maxHops):
+    '''
+    the users of a breadth first walk of (user, hops) pairs, up to the budget
+    '''
+    for reached, (user, hops) in enumerate(walk):
+        if (maxUsers is not None and reached >= maxUsers) or (maxHops is not None and hops > maxHops):
+            return
+        yield user
+
+
+def takeWalk(walk, maxUsers, maxHops):
+    '''
+    Returns (users, fullyCovered) for a breadth first walk of (user, hops) pairs cut off at the budget.
+    Coverage is decided by looking one user past the budget, which costs at most the relationships of the last frontier.
+    '''
+    users = []
+    for user, hops in walk:
+        if (maxUsers is not None and len(users) >= maxUsers) or (maxHops is not None and hops > maxHops):
+            return users, False
+        users.append(user)
+    return users, True
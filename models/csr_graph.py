@@ -0,0 +1,354 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+from models.components import ComponentIndex, sourceComponentRoots, limitWalk, takeWalk
+
+
+def placeUsers(slots, parent, coachOffsets, coachees):
+    '''
+    Fills in parent[slot] for every slot in slots, which must be ascending and closed under relationships
+    (the whole graph, or a union of whole components), following the rules of CoachingGraph.getSpanningTree.
+    Returns the slots in the order they were placed, which is a top-down order of the tree.
+    Slots outside slots are neither read nor written, which lets worker processes fill disjoint
+    parts of one shared parent array.
+    '''
+    def coacheesOf(current):
+        return coachees[coachOffsets[current]:coachOffsets[current + 1]]
+    order = array('i', sourceComponentRoots(slots, coacheesOf))
+    for root in order:
+        parent[root] = -1
+    head = 0
+    while head < len(order):
+        current = order[head]
+        head += 1
+        for coachee in coacheesOf(current):
+            if parent[coachee] == -2:
+                parent[coachee] = current
+                order.append(coachee)
+    return order
+
+
+def nearestSize(sizes, targetSize, i):
+    '''
+    The selection rule of CoachingGraph.selectSubtree over an ascending array of sizes: returns the position
+    of the size nearest to targetSize, the smaller one on a tie, or None when selecting nothing is nearer.
+    i is the position of the first size at least as large as targetSize
+    '''
+    if i < len(sizes) and sizes[i] == targetSize:
+        return i
+    prevSize = sizes[i - 1] if i > 0 else 0
+    if i < len(sizes) and targetSize - prevSize > sizes[i] - targetSize:   #prevSize < targetSize < size
+        return i
+    return i - 1 if i > 0 else None
+
+
+class CompiledCoachingGraph(object):
+    '''
+    A read-optimised form of a CoachingGraph, produced by CoachingGraph.compile()
+
+    Every user is mapped once to a dense integer index and both edge directions are stored
+    in compressed sparse row (CSR) form: the coachees of the user at index i are
+    coachees[coachOffsets[i]:coachOffsets[i+1]], and likewise for coachedBy/coachedByOffsets.
+    The traversals below only ever touch these int arrays, so a hop costs an array read
+    instead of a hash lookup on a UUID.
+
+    The compiled graph does not follow later changes to the CoachingGraph it was built from,
+    compile again after adding users or relationships.
+
+    The indices are the slots of the graph's UserStore, which is shared rather than copied:
+    versions written through the compiled graph are seen by the User handles and vice versa.
+
+    self.store is the UserStore of the source graph
+    self.ids is a list of index:uuid
+    self.size is the number of users at compile time
+    '''
+
+
+    def __init__(self, store, coachOffsets, coachees, coachedByOffsets, coachedBy):
+        '''
+        the arrays can be anything indexable by int, array.array or memoryviews of a snapshot file alike
+        '''
+        self.store = store
+        self.ids = store.ids
+        self.size = len(coachOffsets) - 1
+        self.coachOffsets, self.coachees = coachOffsets, coachees
+        self.coachedByOffsets, self.coachedBy = coachedByOffsets, coachedBy
+
+        self.spanningParent = None  #array of index:parent index, -1 for children of the virtual root
+        self.subtreeSizes = None    #array of index:size of the spanning subtree rooted at that index
+        self.sizeOrder = None       #array of the real users' indices in ascending subtree size, see setSizeIndex
+        self.sizeKeys = None        #array of their subtree sizes, then the virtual root's
+        self.componentIndex = None  #the source graph's ComponentIndex, used to split the work between processes
+        self.virtualRootID = uuid4()  #stands for the virtual root when selectSubtree picks every user
+
+    @classmethod
+    def fromGraph(cls, graph):
+        store = graph.store
+        size = len(store)
+        coachOffsets, coachees = cls._buildCSR(store, size, graph.coaches)
+        coachedByOffsets, coachedBy = cls._buildCSR(store, size, graph.is_coached_by)
+        compiled = cls(store, coachOffsets, coachees, coachedByOffsets, coachedBy)
+        compiled.componentIndex = graph.componentIndex
+        return compiled
+
+    @staticmethod
+    def _buildCSR(store, size, adjacency):
+        '''
+        adjacency is a dict of uuid:[uuids], the neighbour order is preserved
+        '''
+        offsets = array('q', [0])
+        neighbours = array('i')
+        index = store.index
+        for ID in store.ids[:size]:
+            if ID in adjacency:   #avoid creating entries in the source defaultdicts
+                neighbours.extend(index[neighbourID] for neighbourID in adjacency[ID])
+            offsets.append(len(neighbours))
+        return offsets, neighbours
+
+    def __len__(self):
+        return self.size
+
+    def slotOf(self, userID):
+        slot = self.store.index[userID]
+        if slot >= self.size:
+            raise KeyError(userID) #added to the graph after it was compiled
+        return slot
+
+    def countVersion(self, version):
+        return self.store.countVersion(version)
+
+    def usersOnVersion(self, version):
+        '''
+        same as CoachingGraph.usersOnVersion, the store is shared so the counts include users added after compiling
+        '''
+        ids = self.ids
+        return [ids[slot] for slot in self.store.slotsWithVersion(version)]
+
+    def components(self):
+        '''
+        Returns the connected components as lists of slots, removed users (each a component of its own) left out.
+        Uses the source graph's component index when there is one, a snapshot builds its own from the CSR arrays.
+        '''
+        n, ids = self.size, self.ids
+        componentIndex = self.componentIndex
+        if componentIndex is None:
+            componentIndex = ComponentIndex()
+            for slot in range(n):
+                componentIndex.add(slot)
+            coachOffsets, coachees = self.coachOffsets, self.coachees
+            for coach in range(n):
+                for i in range(coachOffsets[coach], coachOffsets[coach + 1]):
+                    componentIndex.union(coach, coachees[i])
+
+        components = []
+        for root in componentIndex.roots():
+            if root < n and ids[root] is None:
+                continue
+            #the source graph may have grown since it was compiled
+            members = [slot for slot in componentIndex.members(root) if slot < n]
+            if members:
+                components.append(members)
+        return components
+
+    def total_infection(self, startingUserID, newVersionNumber, max_users=None, max_hops=None):
+        '''
+        frontier-at-a-time breadth first search with a visited bitmap,
+        the version is written to every reached user in one bulk assignment.
+        The budget and the result are those of CoachingGraph.total_infection
+        '''
+        if max_users is None and max_hops is None:
+            infected, fullyCovered = self._reach(self.slotOf(startingUserID), bytearray(self.size)), True
+        else:
+            infected, fullyCovered = takeWalk(self._walk(self.slotOf(startingUserID)), max_users, max_hops)
+        self.store.setVersions(infected, newVersionNumber)
+        return len(infected), fullyCovered
+
+    def iter_infection(self, startingUserID, max_users=None, max_hops=None):
+        '''
+        same as CoachingGraph.iter_infection
+        '''
+        ids = self.ids
+        return (ids[slot] for slot in limitWalk(self._walk(self.slotOf(startingUserID)), max_users, max_hops))
+
+    def _walk(self, start):
+        '''
+        yields (slot, hops from start) for every user connected to start, each as soon as it is discovered
+        '''
+        visited = bytearray(self.size)
+        visited[start] = 1
+        frontier = [start]
+        hops = 0
+        yield start, hops
+        while frontier:
+            hops += 1
+            nextFrontier = []
+            for current in frontier:
+                for offsets, neighbours in ((self.coachOffsets, self.coachees), (self.coachedByOffsets, self.coachedBy)):
+                    for neighbour in neighbours[offsets[current]:offsets[current + 1]]:
+                        if visited[neighbour]: continue
+                        visited[neighbour] = 1
+                        nextFrontier.append(neighbour)
+                        yield neighbour, hops
+            frontier = nextFrontier
+
+    def total_infection_many(self, seedIDs, newVersionNumber):
+        '''
+        same contract as CoachingGraph.total_infection_many, the seeds share one visited bitmap
+        so every component is searched once
+        '''
+        visited = bytearray(self.size)
+        attribution = {}
+        infected = array('i')
+        for seedID in seedIDs:
+            slot = self.slotOf(seedID)
+            if visited[slot]:
+                attribution.setdefault(seedID, 0)
+                continue
+            reached = self._reach(slot, visited)
+            attribution[seedID] = len(reached)
+            infected.extend(reached)
+        self.store.setVersions(infected, newVersionNumber)
+        return attribution, len(infected)
+
+    def _reach(self, start, visited):
+        '''
+        returns every unvisited user connected to start in either direction, marking them visited
+        '''
+        visited[start] = 1
+        infected = array('i', [start])
+        frontier = infected
+        while frontier:
+            nextFrontier = array('i')
+            #treat relations in both directions identically for infection
+            for offsets, neighbours in ((self.coachOffsets, self.coachees), (self.coachedByOffsets, self.coachedBy)):
+                for current in frontier:
+                    for neighbour in neighbours[offsets[current]:offsets[current + 1]]:
+                        if visited[neighbour]: continue
+                        visited[neighbour] = 1
+                        nextFrontier.append(neighbour)
+            if frontier is not infected:
+                infected.extend(frontier)
+            frontier = nextFrontier
+        return infected
+
+    def limited_infection(self, newVersionNumber, numberToInfect, processes=None):
+        '''
+        same algorithm as CoachingGraph.limited_infection, run over the compiled arrays,
+        processes is passed on to preprocess
+        '''
+        self.preprocess(processes)
+        rootID = self.selectSubtree(numberToInfect)
+        if rootID is not None:
+            self.infectSubtree(newVersionNumber, rootID)
+
+    def preprocess(self, processes=None):
+        '''
+        builds the spanning tree and its subtree sizes, with more than one process the components are
+        split between a pool of worker processes, see models.parallel
+        '''
+        if processes is not None and processes > 1:
+            from models import parallel
+            parallel.buildSpanningTree(self, processes)
+        else:
+            self.getSpanningTree()
+            self.setSubtreeSizes()
+
+    def getSpanningTree(self):
+        '''
+        Follows the same rules as CoachingGraph.getSpanningTree, and gives the same tree:
+        one root per source strongly connected component (users without coaches, and one member of each
+        rootless cycle), then a breadth first search from all of them where every user hangs off the coach
+        that reached it first. The virtual root is represented by a parent of -1.
+
+        Also records the order users were placed in, a top-down order which setSubtreeSizes walks backwards
+        '''
+        parent = array('i', [-2]) * self.size   #-2 marks users not yet in the tree
+        self.spanningOrder = placeUsers(range(self.size), parent, self.coachOffsets, self.coachees)
+        self.spanningParent = parent
+        self.spanningChildOffsets, self.spanningChildren = self._buildChildCSR(parent)
+
+    def _buildChildCSR(self, parent):
+        '''
+        inverts the parent array into a CSR child list with a counting sort
+        '''
+        n = len(parent)
+        counts = array('q', [0]) * (n + 1)
+        for p in parent:
+            if p >= 0:
+                counts[p + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        children = array('i', [0]) * counts[n]
+        fill = array('q', counts)
+        for child, p in enumerate(parent):
+            if p >= 0:
+                children[fill[p]] = child
+                fill[p] += 1
+        return counts, children
+
+    def setSubtreeSizes(self):
+        '''
+        Every child comes after its parent in the spanning order, so walking it backwards
+        is a post-order traversal and needs no recursion
+        '''
+        parent = self.spanningParent
+        sizes = array('q', [1]) * len(parent)
+        for current in reversed(self.spanningOrder):
+            p = parent[current]
+            if p >= 0:
+                sizes[p] += sizes[current]
+        self.subtreeSizes = sizes
+        self.setSizeIndex()
+
+    def setSizeIndex(self):
+        '''
+        Sorts the users by subtree size once per spanning tree, so selectSubtree is a binary search.
+        Removed users are left out, ties keep ascending index order, and the virtual root comes last with the
+        number of users as its size
+        '''
+        ids, subtreeSizes = self.ids, self.subtreeSizes
+        order = sorted((slot for slot in range(self.size) if ids[slot] is not None), key=subtreeSizes.__getitem__)
+        self.sizeOrder = array('i', order)
+        self.sizeKeys = array('q', (subtreeSizes[slot] for slot in order))
+        self.sizeKeys.append(len(order))
+
+    def selectSubtree(self, targetSize):
+        '''
+        Same selection rule as CoachingGraph.selectSubtree over the real users plus the virtual root, which stands for
+        every user: a target nearer the number of users than to any subtree selects self.virtualRootID.
+        A binary search on the size index, only the chosen index is turned into a UUID
+        '''
+        sizeKeys = self.sizeKeys
+        position = nearestSize(sizeKeys, targetSize, bisect_left(sizeKeys, targetSize))
+        if position is None:
+            return None
+        if position == len(self.sizeOrder):
+            return self.virtualRootID
+        return self.ids[self.sizeOrder[position]]
+
+    def infectSubtree(self, newVersionNumber, rootID):
+        self.store.setVersions(self._subtreeSlotsOf(rootID), newVersionNumber)
+
+    def _subtreeSlotsOf(self, rootID):
+        '''
+        the slots of the spanning subtree under rootID, every user's for the virtual root
+        '''
+        if rootID == self.virtualRootID:
+            ids = self.ids
+            return [slot for slot in range(self.size) if ids[slot] is not None]
+        return self.subtreeSlots(self.slotOf(rootID))
+
+    def subtreeSlots(self, root):
+        '''
+        the slots of the spanning subtree rooted at slot root, root first
+        '''
+        childOffsets, children = self.spanningChildOffsets, self.spanningChildren
+        subtree = array('i', [root])
+        for current in subtree:    #grows as it is walked
+            subtree.extend(children[childOffsets[current]:childOffsets[current + 1]])
+        return subtree
@@ -0,0 +1,145 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from array import array
+from models.csr_graph import CompiledCoachingGraph
+from models.snapshot import UUIDTable, UUIDIndex, packIDs
+from models.user_graph import GraphViolation
+from models.user_store import UserStore
+
+
+def _readOnly(data, typecode):
+    '''
+    a packed copy of data that cannot be written to: a memoryview over an immutable bytes object
+    '''
+    return memoryview(array(typecode, data).tobytes()).cast(typecode)
+
+
+class FrozenUserStore(UserStore):
+    '''
+    the copied columns of a FrozenCoachingGraph, every write raises GraphViolation
+    '''
+
+
+    def _refuse(self, *arguments, **keywords):
+        raise GraphViolation('The users of a frozen graph cannot be changed.')
+
+    add = remove = setVersion = setVersions = stage = _refuse
+
+
+class FrozenCoachingGraph(CompiledCoachingGraph):
+    '''
+    An immutable copy of a CoachingGraph, produced by CoachingGraph.freeze(), to be shared between threads
+    and forked worker processes.
+
+    Unlike a CompiledCoachingGraph it shares nothing with the graph it was frozen from. Every column is copied
+    into a read-only memoryview over one packed bytes object: the CSR adjacency, the versions, the spanning tree,
+    subtree sizes and size index, the components, and the UUIDs (a UUIDTable and UUIDIndex as in a snapshot, so there is no dict
+    of UUID objects). Reading them never touches a Python object's reference count, so a forked worker keeps
+    sharing their pages with its parent instead of copying them on first read.
+
+    The spanning tree, components and version index are all built while freezing, so no read writes to the graph
+    and it is safe to read from any number of threads. Infections, rebuilding the tree, assigning attributes and
+    writing to the store raise GraphViolation; plan_total_infection and plan_limited_infection return the users
+    an infection would reach instead. Later changes to the source graph are not seen, freeze it again to pick them up.
+
+    self.componentLabel is an int array of slot:label of its connected component
+    self.componentSizes is an int array of label:component size, 0 for a label not in use
+    self.componentAnchor is an int array of label:a slot of that component
+    self.nextMember is an int array of slot:next slot in the same component, see ComponentIndex
+    '''
+    _frozen = False
+
+
+    @classmethod
+    def fromGraph(cls, graph):
+        if graph.store.layers:  #a frozen graph holds what is committed
+            raise GraphViolation('Commit or discard the staged versions before freezing the graph.')
+        compiled = CompiledCoachingGraph.fromGraph(graph)
+        compiled.preprocess()
+        source = graph.store
+        n = compiled.size
+
+        uuids, uuidOrder = packIDs(source.ids[:n])
+        ids = UUIDTable(memoryview(bytes(uuids)))
+        subtreeSizes = _readOnly(compiled.subtreeSizes, 'q')
+        store = FrozenUserStore.fromColumns(ids, UUIDIndex(ids, _readOnly(uuidOrder, 'i')), tuple(source.names[:n]),
+                                            _readOnly(source.versionCodes[:n], 'i'), subtreeSizes, source.versionTable)
+        store.versionSlots = [frozenset(slots) for slots in store.getVersionSlots()]
+
+        frozen = cls(store, *[_readOnly(data, typecode) for data, typecode in (
+            (compiled.coachOffsets, 'q'), (compiled.coachees, 'i'),
+            (compiled.coachedByOffsets, 'q'), (compiled.coachedBy, 'i'))])
+        frozen.spanningParent = _readOnly(compiled.spanningParent, 'i')
+        frozen.spanningChildOffsets = _readOnly(compiled.spanningChildOffsets, 'q')
+        frozen.spanningChildren = _readOnly(compiled.spanningChildren, 'i')
+        frozen.spanningOrder = _readOnly(compiled.spanningOrder, 'i')
+        frozen.subtreeSizes = subtreeSizes
+        frozen.sizeOrder = _readOnly(compiled.sizeOrder, 'i')
+        frozen.sizeKeys = _readOnly(compiled.sizeKeys, 'q')
+
+        componentIndex = compiled.componentIndex
+        frozen.componentLabel = _readOnly(componentIndex.label[:n], 'i')
+        frozen.componentSizes = _readOnly(componentIndex.sizes, 'i')
+        frozen.componentAnchor = _readOnly(componentIndex.anchor, 'i')
+        frozen.nextMember = _readOnly(componentIndex.nextMember[:n], 'i')
+        frozen._frozen = True
+        return frozen
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise GraphViolation('A frozen graph cannot be changed.')
+        super().__setattr__(name, value)
+
+    def componentSize(self, userID):
+        slot = self.slotOf(userID)
+        return self.componentSizes[self.componentLabel[slot]]
+
+    def components(self):
+        '''
+        the connected components as lists of slots, like CompiledCoachingGraph.components
+        '''
+        componentSizes, componentAnchor, ids = self.componentSizes, self.componentAnchor, self.ids
+        anchors = (componentAnchor[label] for label in range(len(componentSizes)) if componentSizes[label])
+        return [list(self._members(slot)) for slot in anchors if ids[slot] is not None]
+
+    def _members(self, slot):
+        '''
+        yields every slot in the same component as slot, starting with slot itself
+        '''
+        nextMember = self.nextMember
+        current = slot
+        while True:
+            yield current
+            current = nextMember[current]
+            if current == slot:
+                break
+
+    def plan_total_infection(self, startingUserID, max_users=None, max_hops=None):
+        '''
+        the frozenset of user IDs total_infection would infect on the source graph, see CoachingGraph.plan_total_infection
+        '''
+        ids = self.ids
+        if max_users is None and max_hops is None:
+            return frozenset(ids[slot] for slot in self._members(self.slotOf(startingUserID)))
+        return frozenset(self.iter_infection(startingUserID, max_users, max_hops))
+
+    def plan_limited_infection(self, numberToInfect):
+        '''
+        the frozenset of user IDs limited_infection would infect on the source graph
+        '''
+        rootID = self.selectSubtree(numberToInfect)
+        if rootID is None:
+            return frozenset()
+        ids = self.ids
+        return frozenset(ids[slot] for slot in self._subtreeSlotsOf(rootID))
+
+    def preprocess(self, processes=None):
+        pass    #done while freezing
+
+    def _refuse(self, *arguments, **keywords):
+        raise GraphViolation('A frozen graph cannot be infected, plan the infection or infect the source graph.')
+
+    total_infection = total_infection_many = limited_infection = infectSubtree = _refuse
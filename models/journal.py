@@ -0,0 +1,263 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import json
+import os
+import struct
+import zlib
+from uuid import UUID
+from models.user_graph import CoachingGraph, User
+
+
+USERS = 1           #users added, with their names and versions at the time
+RELATIONSHIPS = 2   #(coach, coachee) pairs added
+VERSION = 3         #one version assigned to a batch of users
+REMOVED_USERS = 4           #users removed, with all their relationships
+REMOVED_RELATIONSHIPS = 5   #(coach, coachee) pairs removed
+
+RECORD_HEADER = struct.Struct('<IIB')   #payload length, crc32 of the payload, record type
+LENGTH = struct.Struct('<I')
+
+
+class RolloutJournal(object):
+    '''
+    Append-only log of the changes made to a graph, so a rollout interrupted half way can be restored by replaying
+    the journal on top of the last snapshot instead of being recomputed.
+
+    Every record is one batch: all the users of an addUsers call, all the relationships of an
+    addCoachingRelationships call, every user reached by one infection, or one removed user or relationship. Records are framed with their length
+    and a CRC, so a record torn by a crash is detected and dropped when the journal is reopened.
+    With fsync=True every record is forced to disk before the call that wrote it returns.
+
+    Use attach(graph) to start recording a graph's changes, replay(graph) to apply a journal to a graph
+    and compact() to fold it down to the final state once it grows large; if compactAt is set that happens
+    automatically whenever the journal is compactAt bytes larger than it was after the last compaction.
+    '''
+
+
+    def __init__(self, path, fsync=False, compactAt=None):
+        self.path = path
+        self.fsync = fsync
+        self.compactAt = compactAt
+        self.listeners = [] #(graph, listener) pairs for the attached graphs
+        self._open()
+        self.compactedSize = self.size
+
+    def _open(self):
+        validLength = sum(RECORD_HEADER.size + len(payload) for kind, payload in self._readRecords()) if os.path.exists(self.path) else 0
+        self.file = open(self.path, 'ab')
+        if self.file.tell() != validLength:
+            self.file.truncate(validLength)   #drop a torn record at the end
+            self.file.seek(validLength)
+        self.size = validLength
+
+    def close(self):
+        for graph, listener in self.listeners:
+            graph.store.listeners.remove(listener)
+            graph.journal = None
+        self.listeners = []
+        self.file.close()
+
+    def attach(self, graph):
+        '''
+        records every later change to graph: version assignments through its UserStore, and for a CoachingGraph
+        added and removed users and relationships as well
+        '''
+        def listener(slots, version):
+            ids = graph.store.ids   #looked up each time, CoachingGraph.compact replaces the store
+            self.recordVersion(version, [ids[slot] for slot in slots])
+        graph.journal = self
+        graph.store.listeners.append(listener)
+        self.listeners.append((graph, listener))
+
+    def recordUsers(self, users):
+        self._append(USERS, _withIDs({'names': [user.name for user in users], 'versions': [user.siteVersion for user in users]},
+                                     [user.UUID for user in users]))
+
+    def recordRelationships(self, relationships):
+        self._append(RELATIONSHIPS, b''.join(coachID.bytes + coacheeID.bytes for coachID, coacheeID in relationships))
+
+    def recordRemovedUsers(self, userIDs):
+        self._append(REMOVED_USERS, b''.join(ID.bytes for ID in userIDs))
+
+    def recordRemovedRelationships(self, relationships):
+        self._append(REMOVED_RELATIONSHIPS, b''.join(coachID.bytes + coacheeID.bytes for coachID, coacheeID in relationships))
+
+    def recordVersion(self, version, userIDs):
+        if userIDs:
+            self._append(VERSION, _withIDs(version, userIDs))
+
+    def _append(self, kind, payload):
+        self.size += _writeRecord(self.file, kind, payload)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        if self.compactAt is not None and self.size - self.compactedSize > self.compactAt:
+            self.compact()
+
+    def _readRecords(self):
+        '''
+        yields (type, payload) up to the first incomplete or corrupt record
+        '''
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, crc, kind = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                yield kind, payload
+
+    def records(self):
+        '''
+        yields the journal decoded, as ('users', [(uuid, name, version)]), ('relationships', [(coachID, coacheeID)]),
+        ('version', version, [uuids]), ('removedUsers', [uuids]) and ('removedRelationships', [(coachID, coacheeID)])
+        '''
+        self.file.flush()
+        for kind, payload in self._readRecords():
+            if kind == USERS:
+                data, IDs = _splitIDs(payload)
+                yield 'users', list(zip(IDs, data['names'], data['versions']))
+            elif kind == RELATIONSHIPS:
+                yield 'relationships', _splitPairs(payload)
+            elif kind == VERSION:
+                version, IDs = _splitIDs(payload)
+                yield 'version', version, IDs
+            elif kind == REMOVED_USERS:
+                yield 'removedUsers', [UUID(bytes=payload[i:i + 16]) for i in range(0, len(payload), 16)]
+            elif kind == REMOVED_RELATIONSHIPS:
+                yield 'removedRelationships', _splitPairs(payload)
+
+    def replay(self, graph):
+        '''
+        Applies the journal to graph, normally the snapshot the journal was started from.
+        Added and removed users and relationships need a CoachingGraph; on a CompiledCoachingGraph (e.g. a loaded snapshot)
+        only the version records are applied, to the users it has. The graph should not be attached while replaying.
+        '''
+        store = graph.store
+        structural = isinstance(graph, CoachingGraph)
+        for record in self.records():
+            if record[0] != 'version' and not structural:
+                continue
+            elif record[0] == 'users':
+                newUsers = []
+                for ID, name, version in record[1]:
+                    newUser = User(name, version)
+                    newUser.UUID = ID
+                    newUsers.append(newUser)
+                graph.addUsers(newUsers)
+            elif record[0] == 'relationships':
+                graph.addCoachingRelationships(record[1])
+            elif record[0] == 'removedUsers':
+                for ID in record[1]:
+                    graph.removeUser(ID)
+            elif record[0] == 'removedRelationships':
+                for coachID, coacheeID in record[1]:
+                    graph.removeCoachingRelationship(coachID, coacheeID)
+            else:
+                index = store.index
+                slots = (index.get(ID) for ID in record[2])
+                store.setVersions([slot for slot in slots if slot is not None], record[1])
+
+    def compact(self):
+        '''
+        Rewrites the journal as the smallest set of records with the same end result: the removals of users and
+        relationships that were in the graph before the journal started, every added user still present once,
+        with its final version, every relationship still present once, and one version record per version for
+        the other users. The new journal is written next to the old one and swapped in atomically.
+        '''
+        users = {}          #dict of uuid:[name, version], in the order they were added
+        relationships = {}  #used as an ordered set
+        versions = {}       #dict of uuid:version, for users that were not added in this journal
+        removedUsers = {}           #ordered sets of what was removed from the graph the journal started from,
+                                    #written before the additions so a removed and re-added user comes back
+        removedRelationships = {}
+        byUser = {}         #dict of uuid:{relationships recorded so far with that user at either end}, may hold stale pairs
+        def index(relationship):
+            for ID in relationship:
+                byUser.setdefault(ID, set()).add(relationship)
+        for record in self.records():
+            if record[0] == 'users':
+                for ID, name, version in record[1]:
+                    users[ID] = [name, version]
+            elif record[0] == 'relationships':
+                for relationship in record[1]:
+                    relationships[relationship] = None
+                    index(relationship)
+            elif record[0] == 'removedRelationships':
+                for relationship in record[1]:
+                    if relationships.pop(relationship, False) is False:
+                        removedRelationships[relationship] = None
+                        index(relationship)
+            elif record[0] == 'removedUsers':
+                for ID in record[1]:
+                    #removing a user removes its relationships, the ones it had before the journal with it
+                    for relationship in byUser.pop(ID, ()):
+                        relationships.pop(relationship, None)
+                        removedRelationships.pop(relationship, None)
+                    versions.pop(ID, None)
+                    if users.pop(ID, None) is None:
+                        removedUsers[ID] = None
+            else:
+                for ID in record[2]:
+                    if ID in users:
+                        users[ID][1] = record[1]
+                    else:
+                        versions[ID] = record[1]
+
+        byVersion = {}
+        for ID, version in versions.items():
+            byVersion.setdefault(_versionKey(version), (version, []))[1].append(ID)
+
+        compactPath = self.path + '.compact'
+        with open(compactPath, 'wb') as f:
+            if removedRelationships:
+                _writeRecord(f, REMOVED_RELATIONSHIPS, b''.join(coachID.bytes + coacheeID.bytes for coachID, coacheeID in removedRelationships))
+            if removedUsers:
+                _writeRecord(f, REMOVED_USERS, b''.join(ID.bytes for ID in removedUsers))
+            if users:
+                _writeRecord(f, USERS, _withIDs({'names': [name for name, version in users.values()],
+                                                 'versions': [version for name, version in users.values()]}, list(users)))
+            if relationships:
+                _writeRecord(f, RELATIONSHIPS, b''.join(coachID.bytes + coacheeID.bytes for coachID, coacheeID in relationships))
+            for version, IDs in byVersion.values():
+                _writeRecord(f, VERSION, _withIDs(version, IDs))
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(compactPath, self.path)
+        self._open()
+        self.compactedSize = self.size
+
+
+def _writeRecord(f, kind, payload):
+    f.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), kind))
+    f.write(payload)
+    return RECORD_HEADER.size + len(payload)
+
+
+def _splitPairs(payload):
+    return [(UUID(bytes=payload[i:i + 16]), UUID(bytes=payload[i + 16:i + 32])) for i in range(0, len(payload), 32)]
+
+
+def _withIDs(data, IDs):
+    encoded = json.dumps(data).encode('utf-8')
+    return LENGTH.pack(len(encoded)) + encoded + b''.join(ID.bytes for ID in IDs)
+
+
+def _splitIDs(payload):
+    length, = LENGTH.unpack_from(payload)
+    data = json.loads(payload[LENGTH.size:LENGTH.size + length].decode('utf-8'))
+    raw = payload[LENGTH.size + length:]
+    return data, [UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16)]
+
+
+def _versionKey(version):
+    '''
+    versions come back from JSON, so 1 and 1.0 or lists and tuples are the same version here
+    '''
+    return json.dumps(version)
@@ -0,0 +1,102 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import codecs
+import csv
+import gzip
+from models.user_graph import GraphViolation, User
+
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def readChunks(path, delimiter=None, chunkSize=DEFAULT_CHUNK_SIZE, skipHeader=True, progress=None, encoding='utf-8'):
+    '''
+    Reads a CSV/TSV file (optionally gzipped) and yields its rows in lists of at most chunkSize,
+    so only one chunk is ever held in memory.
+    The delimiter defaults to a tab for .tsv/.tab files and a comma otherwise.
+    progress, if given, is called as progress(rowsRead, bytesRead) after every chunk.
+    '''
+    plainPath = path[:-3] if path.endswith('.gz') else path
+    if delimiter is None:
+        delimiter = '\t' if plainPath.endswith(('.tsv', '.tab')) else ','
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rb') as rawFile:
+        bytesRead = [0]
+        decoder = codecs.getincrementaldecoder(encoding)()
+        def lines():
+            #decoding ourselves keeps a byte count, which text mode hides while iterating
+            for rawLine in rawFile:
+                bytesRead[0] += len(rawLine)
+                yield decoder.decode(rawLine)
+
+        reader = csv.reader(lines(), delimiter=delimiter)
+        if skipHeader:
+            next(reader, None)
+        rowsRead = 0
+        chunk = []
+        for row in reader:
+            if not row:
+                continue
+            chunk.append(row)
+            if len(chunk) == chunkSize:
+                rowsRead += len(chunk)
+                yield chunk
+                chunk = []
+                if progress: progress(rowsRead, bytesRead[0])
+        if chunk:
+            rowsRead += len(chunk)
+            yield chunk
+        if progress: progress(rowsRead, bytesRead[0])
+
+
+def loadUsers(graph, path, idMap=None, idColumn=0, nameColumn=1, versionColumn=None, parseVersion=None, **readOptions):
+    '''
+    Streams a user roster into graph, one addUsers call per chunk.
+    Each row's external ID (idColumn) is mapped to the UUID of the User created for it, idMap is that
+    dict of externalID:uuid and is returned, pass it on to loadRelationships.
+    If versionColumn is given, parseVersion turns the text into a version (empty cells mean no version).
+    readOptions are passed to readChunks.
+    '''
+    if idMap is None:
+        idMap = {}
+    for chunk in readChunks(path, **readOptions):
+        newUsers = []
+        for row in chunk:
+            version = row[versionColumn] if versionColumn is not None else None
+            if version and parseVersion:
+                version = parseVersion(version)
+            newUser = User(row[nameColumn] if nameColumn is not None else row[idColumn], version)
+            newUsers.append(newUser)
+            idMap[row[idColumn]] = newUser.UUID
+        graph.addUsers(newUsers)
+    return idMap
+
+
+def loadRelationships(graph, path, idMap, coachColumn=0, coacheeColumn=1, **readOptions):
+    '''
+    Streams a coach->coachee edge list of external IDs into graph, one addCoachingRelationships call per chunk.
+    Rows with IDs missing from idMap are reported the same way as the graph's own checks,
+    as a GraphViolation listing the offending rows of that chunk, numbered from the first data row of the file.
+    '''
+    firstRow = 0
+    for chunk in readChunks(path, **readOptions):
+        relationships = []
+        violations = []
+        for row, fields in enumerate(chunk, firstRow):
+            coachID, coacheeID = idMap.get(fields[coachColumn]), idMap.get(fields[coacheeColumn])
+            if coachID is None or coacheeID is None:
+                missing = fields[coachColumn] if coachID is None else fields[coacheeColumn]
+                violations.append((row, 'Unknown external ID {}'.format(missing)))
+            else:
+                relationships.append((coachID, coacheeID))
+        if violations:
+            raise GraphViolation.fromViolations('relationships', violations)
+        try:
+            graph.addCoachingRelationships(relationships)
+        except GraphViolation as violation:
+            raise GraphViolation.fromViolations('relationships', [(row + firstRow, message) for row, message in violation.violations])
+        firstRow += len(chunk)
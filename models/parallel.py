@@ -0,0 +1,125 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import heapq
+import multiprocessing
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+from models.csr_graph import placeUsers
+
+
+GROUPS_PER_PROCESS = 4  #more groups than processes, so one large group doesn't leave the others idle
+
+_worker = {}    #the shared arrays, attached once per worker process by _attach
+
+
+def buildSpanningTree(compiled, processes, groupsPerProcess=GROUPS_PER_PROCESS):
+    '''
+    Builds the spanning tree and subtree sizes of a CompiledCoachingGraph in a pool of processes.
+
+    Components never share spanning tree edges, so they are packed into groups of about equal size,
+    largest first, and each worker places the users of one group at a time. The CSR arrays are copied once
+    into shared memory and every worker writes its parents, sizes and top-down order straight into shared
+    output arrays, so no user data is pickled either way. The roots of the groups all have a parent of -1,
+    which is what hangs them off the virtual root, and each group writes its top-down order over its own
+    stretch of groupSlots, so together they make the top-down order of the whole tree.
+
+    The result is the same as compiled.getSpanningTree() followed by compiled.setSubtreeSizes().
+    '''
+    n = compiled.size
+    groupOffsets, groupSlots = _componentGroups(compiled, processes * groupsPerProcess)
+    inputs = {
+        'coachOffsets': ('q', compiled.coachOffsets),
+        'coachees': ('i', compiled.coachees),
+        'groupOffsets': ('q', groupOffsets),
+        'groupSlots': ('i', groupSlots),
+        }
+    outputs = {'parent': ('i', n), 'sizes': ('q', n), 'order': ('i', n)}
+
+    blocks = []
+    try:
+        layout = {}
+        for name, (typecode, data) in inputs.items():
+            raw = memoryview(data).cast('B')
+            block = SharedMemory(create=True, size=max(len(raw), 1))
+            blocks.append(block)
+            block.buf[:len(raw)] = raw
+            layout[name] = (block.name, typecode, len(raw))
+        for name, (typecode, length) in outputs.items():
+            nbytes = length * array(typecode).itemsize
+            block = SharedMemory(create=True, size=max(nbytes, 1))
+            blocks.append(block)
+            layout[name] = (block.name, typecode, nbytes)
+
+        with multiprocessing.Pool(processes, initializer=_attach, initargs=(layout,)) as pool:
+            pool.map(_buildGroup, range(len(groupOffsets) - 1))
+
+        blockOf = dict(zip(layout, blocks))
+        parent, sizes, order = array('i'), array('q'), array('i')
+        for name, result in (('parent', parent), ('sizes', sizes), ('order', order)):
+            result.frombytes(blockOf[name].buf[:layout[name][2]])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    compiled.spanningParent = parent
+    compiled.spanningChildOffsets, compiled.spanningChildren = compiled._buildChildCSR(parent)
+    compiled.spanningOrder = order
+    compiled.subtreeSizes = sizes
+    compiled.setSizeIndex()
+
+
+def _componentGroups(compiled, groupCount):
+    '''
+    Returns (groupOffsets, groupSlots): the slots of group g, ascending, are groupSlots[groupOffsets[g]:groupOffsets[g+1]].
+    Removed users are not in compiled.components() but still get a place in the tree, as roots of their own.
+    '''
+    ids = compiled.ids
+    components = compiled.components() + [[slot] for slot in range(compiled.size) if ids[slot] is None]
+    components.sort(key=len, reverse=True)
+
+    groups = [[] for _ in range(min(groupCount, len(components)))]
+    loads = [(0, group) for group in range(len(groups))]
+    for members in components:
+        load, group = heapq.heappop(loads)
+        groups[group].extend(members)
+        heapq.heappush(loads, (load + len(members), group))
+
+    groupOffsets = array('q', [0])
+    groupSlots = array('i')
+    for members in groups:
+        members.sort()
+        groupSlots.extend(members)
+        groupOffsets.append(len(groupSlots))
+    return groupOffsets, groupSlots
+
+
+def _attach(layout):
+    '''
+    pool initializer, maps the shared arrays into the worker
+    '''
+    for name, (blockName, typecode, nbytes) in layout.items():
+        block = SharedMemory(name=blockName)
+        _worker[name] = block.buf[:nbytes].cast(typecode)
+        _worker[name + 'Block'] = block  #keeps the mapping open for the life of the worker
+
+
+def _buildGroup(group):
+    '''
+    places the users of one group and computes their subtree sizes
+    '''
+    start, end = _worker['groupOffsets'][group], _worker['groupOffsets'][group + 1]
+    slots = _worker['groupSlots'][start:end]
+    parent, sizes, order = _worker['parent'], _worker['sizes'], _worker['order']
+    for slot in slots:
+        parent[slot] = -2
+        sizes[slot] = 1
+    groupOrder = placeUsers(slots, parent, _worker['coachOffsets'], _worker['coachees'])
+    for current in reversed(groupOrder):
+        p = parent[current]
+        if p >= 0:
+            sizes[p] += sizes[current]
+    order[start:end] = groupOrder
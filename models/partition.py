@@ -0,0 +1,246 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import heapq
+import random
+from itertools import chain
+from models.subset_sum import closestSubsetSum, DEFAULT_MEMORY_BUDGET
+
+
+DEFAULT_TOLERANCE = 0.05    #fraction of the target the selection may be off by, in exchange for fewer cut relationships
+DEFAULT_ROUNDS = 10         #label propagation rounds, most graphs settle in fewer
+SUBTREE_CANDIDATES = 8      #spanning subtrees of about the right size tried as carves
+
+
+def selectPartition(compiled, targetSize, tolerance=DEFAULT_TOLERANCE, rounds=DEFAULT_ROUNDS, seed=0,
+                    memoryBudget=DEFAULT_MEMORY_BUDGET):
+    '''
+    Chooses about targetSize users of a CompiledCoachingGraph so that as few coaching relationships as possible
+    have one end inside the selection and one outside. Returns (slots, cut): the chosen slots and the number of
+    relationships cut.
+
+    Any size within tolerance * targetSize of the target is accepted, a larger tolerance trades size for cut:
+    1. Whole components cut nothing, so first a subset sum over the component sizes looks for a combination
+       inside the tolerance band.
+    2. Otherwise the gap below the target is carved out of the smallest component larger than it, in two ways,
+       and the carve cutting fewer relationships wins:
+       - by communities: label propagation splits the component into communities of at most the gap, and the
+         carve grows from the largest community, always adding the adjacent community with the most
+         relationships into what is already chosen, while it still fits
+       - by subtrees: disjoint spanning subtrees, starting from those closest to the gap in size. Each cuts a
+         single tree relationship plus whatever other relationships leave it, so tree-like classrooms are never
+         split worse than limited_infection would split them
+    3. A carve still short of the band is filled user by user, always taking the neighbour
+       with the most relationships into the selection.
+    Label propagation and the growth steps are near linear in the size of the component being carved,
+    the rest of the graph is only touched through the component sizes and the spanning tree.
+    '''
+    slack = int(tolerance * targetSize)
+    components = compiled.components()
+    sizes = [len(members) for members in components]
+
+    chosen = _chooseComponents(sizes, targetSize + slack, memoryBudget)
+    total = sum(sizes[i] for i in chosen)
+    if total < targetSize - slack:
+        chosen = _chooseComponents(sizes, targetSize, memoryBudget)
+        total = sum(sizes[i] for i in chosen)
+    slots = [slot for i in chosen for slot in components[i]]
+
+    gap = targetSize - total
+    if gap > slack:
+        chosenSet = set(chosen)
+        larger = [i for i in range(len(components)) if i not in chosenSet and sizes[i] > gap]
+        if larger:
+            members = components[min(larger, key=sizes.__getitem__)]
+            carves = [carve(compiled, members, gap, slack, rounds, random.Random(seed)),
+                      carveSubtree(compiled, members, gap, slack)]
+            slots += min(carves, key=lambda carved: (cutSize(compiled, carved), abs(gap - len(carved))))
+    return slots, cutSize(compiled, slots)
+
+
+def _chooseComponents(sizes, limit, memoryBudget):
+    '''
+    positions of the components whose sizes add up closest to limit from below, largest first if the bitset is too big
+    '''
+    result = closestSubsetSum(sizes, limit, memoryBudget)
+    if result is not None:
+        return result[0]
+    chosen = []
+    for i in sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True):
+        if sizes[i] <= limit:
+            chosen.append(i)
+            limit -= sizes[i]
+    return chosen
+
+
+def carve(compiled, members, size, slack=0, rounds=DEFAULT_ROUNDS, generator=None):
+    '''
+    returns between size - slack and size slots of members (one connected component) with few relationships
+    leaving them, see selectPartition
+    '''
+    label = labelPropagation(compiled, members, size, rounds, generator or random.Random(0))
+    communities = {}    #dict of label:[slots]
+    for slot in members:
+        communities.setdefault(label[slot], []).append(slot)
+
+    chosen = set()
+    remaining = size
+    start = max((community for community in communities.values() if len(community) <= remaining), key=len, default=None)
+    if start is not None:
+        #grow community by community, the heap holds (-relationships into the chosen set, label), possibly stale
+        links = {}
+        heap = []
+        def add(community):
+            chosen.update(community)
+            for slot in community:
+                for neighbour in _neighbours(compiled, slot):
+                    other = label[neighbour]
+                    if neighbour not in chosen:
+                        links[other] = links.get(other, 0) + 1
+                        heapq.heappush(heap, (-links[other], other))
+        add(start)
+        remaining -= len(start)
+        del communities[label[start[0]]]
+        while heap and remaining > slack:
+            negativeLinks, other = heapq.heappop(heap)
+            if other not in communities or -negativeLinks != links[other]:
+                continue
+            if len(communities[other]) > remaining:
+                continue    #the gap only shrinks, so it will never fit
+            community = communities.pop(other)
+            add(community)
+            remaining -= len(community)
+
+    if remaining > slack:
+        chosen |= _fillUsers(compiled, members, chosen, remaining - slack)
+    return list(chosen)
+
+
+def carveSubtree(compiled, members, size, slack=0):
+    '''
+    Returns disjoint spanning subtrees inside members (one connected component) adding up to about size, filled
+    up to size - slack if they fall short. Each of the subtrees closest to size is tried as the first one, the rest
+    are packed in largest first, and the packing that cuts the fewest relationships is returned.
+    '''
+    if compiled.spanningParent is None:
+        compiled.preprocess()
+    subtreeSizes = compiled.subtreeSizes
+    bySize = sorted(members, key=subtreeSizes.__getitem__, reverse=True)
+    firstRoots = heapq.nsmallest(SUBTREE_CANDIDATES, (slot for slot in members if subtreeSizes[slot] <= size + slack),
+                                 key=lambda slot: abs(size - subtreeSizes[slot]))
+    best, bestCut = [], None
+    for firstRoot in firstRoots:
+        carved = _packSubtrees(compiled, bySize, firstRoot, size, slack)
+        if len(carved) < size - slack:
+            carved |= _fillUsers(compiled, members, carved, size - slack - len(carved))
+        cut = cutSize(compiled, carved)
+        if bestCut is None or cut < bestCut:
+            best, bestCut = list(carved), cut
+    return best
+
+
+def _packSubtrees(compiled, bySize, firstRoot, size, slack):
+    '''
+    the subtree of firstRoot plus, largest first, every subtree that still fits and does not overlap
+    '''
+    chosen = set(compiled.subtreeSlots(firstRoot))
+    blocked = set()     #the ancestors of firstRoot, which contain it
+    ancestor = compiled.spanningParent[firstRoot]
+    while ancestor >= 0:
+        blocked.add(ancestor)
+        ancestor = compiled.spanningParent[ancestor]
+    remaining = size - len(chosen)
+    subtreeSizes = compiled.subtreeSizes
+    for slot in bySize:
+        if remaining <= slack:
+            break
+        #an ancestor is always larger, so it has already been passed over or chosen by the time we get here
+        if subtreeSizes[slot] > remaining or slot in chosen or slot in blocked:
+            continue
+        chosen.update(compiled.subtreeSlots(slot))
+        remaining -= subtreeSizes[slot]
+    return chosen
+
+
+def _fillUsers(compiled, members, chosen, count):
+    '''
+    returns count more slots of members, each the one with the most relationships into the chosen slots at the time
+    '''
+    added = set()
+    links = {}
+    heap = []
+    def add(slot):
+        added.add(slot)
+        for neighbour in _neighbours(compiled, slot):
+            if neighbour not in chosen and neighbour not in added:
+                links[neighbour] = links.get(neighbour, 0) + 1
+                heapq.heappush(heap, (-links[neighbour], neighbour))
+    for slot in chosen:
+        for neighbour in _neighbours(compiled, slot):
+            if neighbour not in chosen:
+                links[neighbour] = links.get(neighbour, 0) + 1
+                heapq.heappush(heap, (-links[neighbour], neighbour))
+    if not heap:    #nothing chosen yet, start from the user with the fewest relationships
+        add(min(members, key=lambda slot: _degree(compiled, slot)))
+    while len(added) < count and heap:
+        negativeLinks, slot = heapq.heappop(heap)
+        if slot in added or -negativeLinks != links[slot]:
+            continue
+        add(slot)
+    return added
+
+
+def labelPropagation(compiled, members, maxCommunity, rounds=DEFAULT_ROUNDS, generator=None):
+    '''
+    Returns a dict of slot:label grouping members into communities of at most maxCommunity users.
+    Every user starts in its own community, then in each round every user (in random order) joins the community
+    most of its neighbours are in, if that community has room. Stops after rounds or once nobody moves.
+    '''
+    generator = generator or random.Random(0)
+    label = {slot: slot for slot in members}
+    communitySize = dict.fromkeys(members, 1)
+    order = list(members)
+    for _ in range(rounds):
+        generator.shuffle(order)
+        moved = 0
+        for slot in order:
+            counts = {}
+            for neighbour in _neighbours(compiled, slot):
+                other = label[neighbour]
+                counts[other] = counts.get(other, 0) + 1
+            current = label[slot]
+            best, bestCount = current, counts.get(current, 0)
+            for other, count in counts.items():
+                if count > bestCount and communitySize[other] < maxCommunity:
+                    best, bestCount = other, count
+            if best != current:
+                label[slot] = best
+                communitySize[current] -= 1
+                communitySize[best] += 1
+                moved += 1
+        if not moved:
+            break
+    return label
+
+
+def cutSize(compiled, slots):
+    '''
+    number of coaching relationships with exactly one end in slots
+    '''
+    chosen = set(slots)
+    return sum(1 for slot in chosen for neighbour in _neighbours(compiled, slot) if neighbour not in chosen)
+
+
+def _neighbours(compiled, slot):
+    '''
+    the coachees and coaches of slot, relationships are treated the same in both directions
+    '''
+    return chain(compiled.coachees[compiled.coachOffsets[slot]:compiled.coachOffsets[slot + 1]],
+                 compiled.coachedBy[compiled.coachedByOffsets[slot]:compiled.coachedByOffsets[slot + 1]])
+
+
+def _degree(compiled, slot):
+    return (compiled.coachOffsets[slot + 1] - compiled.coachOffsets[slot] +
+            compiled.coachedByOffsets[slot + 1] - compiled.coachedByOffsets[slot])
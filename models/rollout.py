@@ -0,0 +1,145 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import asyncio
+from itertools import islice
+from models.user_graph import GraphViolation
+
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CONCURRENCY = 4
+
+
+class RolloutPipeline(object):
+    '''
+    Runs infections on a CoachingGraph and publishes every infected user to an external store
+    (e.g. the feature-flag service) while the traversal is still going.
+
+    Infected users are grouped into batches of batchSize as they are reached. Each batch is written to the graph
+    and put on a bounded queue, and concurrency publisher tasks take batches off it and await sink.publish.
+    At most maxPendingBatches batches wait in the queue; once it is full the traversal waits for a publisher,
+    so a slow sink holds back the traversal instead of piling up memory.
+
+    The sink is any object with a coroutine publish(version, userIDs). If it raises, no further batches are
+    published, the traversal stops and the error is raised from the infection call. Batches already written
+    to the graph stay written, run the infection inside graph.stage() to be able to discard them.
+    '''
+
+
+    def __init__(self, graph, sink, batchSize=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, maxPendingBatches=None):
+        self.graph = graph
+        self.sink = sink
+        self.batchSize = batchSize
+        self.concurrency = concurrency
+        self.maxPendingBatches = maxPendingBatches if maxPendingBatches is not None else 2 * concurrency
+
+    async def total_infection(self, startingUserID, newVersionNumber):
+        '''
+        CoachingGraph.total_infection, published as it goes. Returns the number of users infected
+        '''
+        graph = self.graph
+        if startingUserID not in graph.users:
+            raise GraphViolation('User with ID {} does not exist.'.format(startingUserID))
+        return await self.rollout(graph.componentIndex.members(graph.store.index[startingUserID]), newVersionNumber)
+
+    async def limited_infection(self, newVersionNumber, numberToInfect):
+        '''
+        CoachingGraph.limited_infection, published as it goes. Returns the number of users infected
+        '''
+        graph = self.graph
+        graph.updateSpanningTree()
+        rootID = graph.selectSubtree(numberToInfect)
+        if rootID is None:
+            return 0
+        return await self.rollout(self._subtreeSlots(rootID), newVersionNumber)
+
+    def _subtreeSlots(self, rootID):
+        '''
+        yields the slots of the spanning subtree under rootID, the same users CoachingGraph.infectSubtree infects
+        '''
+        index, spanningCoaches = self.graph.store.index, self.graph.spanningCoaches
+        subtreeIDs = [rootID]
+        for currentUserID in subtreeIDs:
+            slot = index.get(currentUserID)
+            if slot is not None:    #the virtual root is not a real user
+                yield slot
+            subtreeIDs.extend(spanningCoaches.get(currentUserID, ()))
+
+    async def rollout(self, slots, newVersionNumber):
+        '''
+        Gives every user in slots (an iterable of UserStore slots, consumed lazily) the new version and
+        publishes them. Returns the number of users infected
+        '''
+        store = self.graph.store
+        queue = asyncio.Queue(self.maxPendingBatches)
+        failures = []
+        publishers = [asyncio.ensure_future(self._publishBatches(queue, newVersionNumber, failures))
+                      for _ in range(self.concurrency)]
+        infected = 0
+        try:
+            slots = iter(slots)
+            while not failures:
+                batch = list(islice(slots, self.batchSize))
+                if not batch:
+                    break
+                store.setVersions(batch, newVersionNumber)
+                infected += len(batch)
+                await queue.put([store.ids[slot] for slot in batch])
+                await asyncio.sleep(0)  #let the publishers start on the batch before walking on
+            for _ in publishers:
+                await queue.put(None)
+            await asyncio.gather(*publishers)
+        finally:
+            for publisher in publishers:
+                publisher.cancel()
+        if failures:
+            raise failures[0]
+        return infected
+
+    async def _publishBatches(self, queue, version, failures):
+        '''
+        publisher task, after a failure it keeps emptying the queue so the traversal is never left waiting
+        '''
+        while True:
+            userIDs = await queue.get()
+            if userIDs is None:
+                return
+            if not failures:
+                try:
+                    await self.sink.publish(version, userIDs)
+                except Exception as failure:
+                    failures.append(failure)
+
+
+class InMemorySink(object):
+    '''
+    In-process stand-in for the feature-flag store, for tests and dry runs.
+    Records every published batch and the version of every user, and optionally waits delay seconds
+    per batch and raises failure on the failAt-th batch (counting from 0) to exercise the pipeline.
+    '''
+
+
+    def __init__(self, delay=0, failAt=None, failure=None):
+        self.delay = delay
+        self.failAt = failAt
+        self.failure = failure if failure is not None else IOError('publish failed')
+        self.batches = []   #list of (version, [userIDs]) in the order they were published
+        self.versions = {}  #dict of userID:version
+        self.calls = 0
+        self.active = 0
+        self.peakActive = 0 #largest number of publish calls in flight at once
+
+    async def publish(self, version, userIDs):
+        self.calls += 1
+        if self.calls - 1 == self.failAt:
+            raise self.failure
+        self.active += 1
+        self.peakActive = max(self.peakActive, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            self.batches.append((version, list(userIDs)))
+            self.versions.update(dict.fromkeys(userIDs, version))
+        finally:
+            self.active -= 1
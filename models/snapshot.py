@@ -0,0 +1,246 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import json
+import mmap as mmapModule
+import struct
+import sys
+from array import array
+from uuid import UUID
+from models.csr_graph import CompiledCoachingGraph
+from models.user_store import UserStore
+
+
+MAGIC = b'CGSNAP\x00\x00'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sIIQ') #magic, format version, reserved, header length
+
+
+def save(compiled, path, includeSpanningTree=True):
+    '''
+    Writes a CompiledCoachingGraph to path, computing its spanning tree first if it is to be included.
+    
+    Snapshot layout, every section starts on an 8 byte boundary:
+
+        preamble    magic, format version and the length of the JSON header
+        header      JSON: user count, byte order, version table and a directory of name:[offset, length, typecode]
+        uuids       16 bytes per user, in slot order
+        uuidOrder   int32 slots sorted by UUID bytes, used to look users up without building a dict
+        versionCodes, coachOffsets, coachees, coachedByOffsets, coachedBy
+                    the UserStore version column and the CSR arrays of CompiledCoachingGraph
+        names       JSON list of user names
+        spanningParent, spanningChildOffsets, spanningChildren, spanningOrder, subtreeSizes
+                    the cached spanning tree, only present if it was saved
+
+    Every array is stored in the machine's byte order and read back as a memoryview of the file.
+    '''
+    store = compiled.store
+    n = compiled.size
+    if includeSpanningTree and compiled.spanningParent is None:
+        compiled.getSpanningTree()
+        compiled.setSubtreeSizes()
+
+    uuids, uuidOrder = packIDs(store.ids[:n])
+    sections = [
+        ('uuids', 'B', uuids),
+        ('uuidOrder', 'i', uuidOrder),
+        ('versionCodes', 'i', array('i', store.versionCodes[:n])),
+        ('coachOffsets', 'q', compiled.coachOffsets),
+        ('coachees', 'i', compiled.coachees),
+        ('coachedByOffsets', 'q', compiled.coachedByOffsets),
+        ('coachedBy', 'i', compiled.coachedBy),
+        ('names', 'B', json.dumps(list(store.names[:n])).encode('utf-8')),
+        ]
+    if includeSpanningTree:
+        sections += [
+            ('spanningParent', 'i', compiled.spanningParent),
+            ('spanningChildOffsets', 'q', compiled.spanningChildOffsets),
+            ('spanningChildren', 'i', compiled.spanningChildren),
+            ('spanningOrder', 'i', compiled.spanningOrder),
+            ('subtreeSizes', 'q', compiled.subtreeSizes),
+            ]
+
+    payloads = [bytes(data) if isinstance(data, (bytes, bytearray)) else memoryview(data).cast('B') for name, typecode, data in sections]
+    directory = {}
+    header = b''
+    while True:
+        #the header holds the section offsets, which depend on the header length, so repeat until it settles
+        offset = _align(PREAMBLE.size + len(header))
+        for (name, typecode, data), payload in zip(sections, payloads):
+            directory[name] = [offset, len(payload), typecode]
+            offset = _align(offset + len(payload))
+        newHeader = json.dumps({
+            'users': n,
+            'byteorder': sys.byteorder,
+            'versionTable': store.versionTable,
+            'sections': directory,
+            }).encode('utf-8')
+        settled = len(newHeader) == len(header)
+        header = newHeader
+        if settled:
+            break
+
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header)))
+        f.write(header)
+        for (name, typecode, data), payload in zip(sections, payloads):
+            f.write(b'\x00' * (directory[name][0] - f.tell()))
+            f.write(payload)
+
+
+def load(path, mmap=True):
+    '''
+    Returns a CompiledCoachingGraph whose arrays are views of the snapshot file.
+    With mmap the file is mapped copy-on-write: nothing is read up front, processes loading the same snapshot share
+    the page cache, and infections only copy the pages of the version column they touch, the file is never written.
+    '''
+    with open(path, 'rb') as f:
+        if mmap:
+            buffer = mmapModule.mmap(f.fileno(), 0, access=mmapModule.ACCESS_COPY)
+        else:
+            buffer = bytearray(f.read())
+    view = memoryview(buffer)
+
+    magic, formatVersion, reserved, headerLength = PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError('{} is not a coaching graph snapshot'.format(path))
+    if formatVersion != FORMAT_VERSION:
+        raise ValueError('Unsupported snapshot format version {}'.format(formatVersion))
+    header = json.loads(bytes(view[PREAMBLE.size:PREAMBLE.size + headerLength]).decode('utf-8'))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError('Snapshot was written on a {} endian machine'.format(header['byteorder']))
+
+    def section(name):
+        offset, length, typecode = header['sections'][name]
+        return view[offset:offset + length].cast(typecode)
+
+    ids = UUIDTable(section('uuids'))
+    hasSpanningTree = 'spanningParent' in header['sections']
+    store = UserStore.fromColumns(
+        ids,
+        UUIDIndex(ids, section('uuidOrder')),
+        LazyNames(section('names')),
+        section('versionCodes'),
+        section('subtreeSizes') if hasSpanningTree else array('q', [0]) * header['users'],
+        header['versionTable'],
+        )
+    compiled = CompiledCoachingGraph(store, section('coachOffsets'), section('coachees'),
+                                     section('coachedByOffsets'), section('coachedBy'))
+    if hasSpanningTree:
+        compiled.spanningParent = section('spanningParent')
+        compiled.spanningChildOffsets = section('spanningChildOffsets')
+        compiled.spanningChildren = section('spanningChildren')
+        compiled.spanningOrder = section('spanningOrder')
+        compiled.subtreeSizes = store.subtreeSizes
+        compiled.setSizeIndex()
+    compiled.snapshotBuffer = buffer #keeps the mapping open as long as the graph lives
+    return compiled
+
+
+def packIDs(ids):
+    '''
+    Returns (uuids, order): the ids packed 16 bytes each, all zeros for a removed user, and the int array of
+    their positions sorted by UUID bytes, the two columns behind UUIDTable and UUIDIndex
+    '''
+    uuids = bytearray()
+    for ID in ids:
+        uuids += ID.bytes if ID is not None else bytes(16)
+    return uuids, array('i', sorted(range(len(ids)), key=lambda slot: uuids[16 * slot:16 * slot + 16]))
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class UUIDTable(object):
+    '''
+    slot:uuid over the packed 16 byte table, UUID objects are only created when asked for.
+    The slots of removed users are all zeros and read back as None
+    '''
+
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __len__(self):
+        return len(self.raw) // 16
+
+    def __getitem__(self, slot):
+        if isinstance(slot, slice):
+            return [self[i] for i in range(*slot.indices(len(self)))]
+        if slot < 0:
+            slot += len(self)
+        if not 0 <= slot < len(self):
+            raise IndexError(slot)
+        raw = bytes(self.raw[16 * slot:16 * slot + 16])
+        return UUID(bytes=raw) if any(raw) else None
+
+    def __iter__(self):
+        return (self[slot] for slot in range(len(self)))
+
+
+class UUIDIndex(object):
+    '''
+    uuid:slot by binary search over the slots sorted by UUID, so no dict of every user has to be built
+    '''
+
+
+    def __init__(self, ids, order):
+        self.raw = ids.raw
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def get(self, ID, default=None):
+        key = ID.bytes if isinstance(ID, UUID) else None
+        if key is None:
+            return default
+        raw, order = self.raw, self.order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            slot = order[middle]
+            if bytes(raw[16 * slot:16 * slot + 16]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order) and bytes(raw[16 * order[low]:16 * order[low] + 16]) == key:
+            return order[low]
+        return default
+
+    def __getitem__(self, ID):
+        slot = self.get(ID)
+        if slot is None:
+            raise KeyError(ID)
+        return slot
+
+    def __contains__(self, ID):
+        return self.get(ID) is not None
+
+
+class LazyNames(object):
+    '''
+    the names are only parsed the first time one is needed
+    '''
+
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.names = None
+
+    def _load(self):
+        if self.names is None:
+            self.names = json.loads(bytes(self.raw).decode('utf-8'))
+        return self.names
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, slot):
+        return self._load()[slot]
+
+    def __setitem__(self, slot, name):
+        self._load()[slot] = name
@@ -0,0 +1,75 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from time import perf_counter
+
+
+class InfectionStats(object):
+    '''
+    Wall time and counters per phase of the infection algorithms, filled in by a CoachingGraph after instrument()
+
+    self.phases is a dict of phase:PhaseStats, one per phase that has run, the phases being
+    total_infection, limited_infection and the steps of the latter: getSpanningTree, setSubtreeSizes,
+    selectSubtree and infectSubtree
+    self.hooks are called as hook(phase, seconds, counters) every time a phase ends, counters being a dict
+    of the counters of that run alone
+    '''
+
+
+    def __init__(self):
+        self.phases = {}
+        self.hooks = []
+
+    def record(self, phase, start, **counters):
+        '''
+        called at the end of a phase that started at perf_counter() == start
+        '''
+        seconds = perf_counter() - start
+        phaseStats = self.phases.get(phase)
+        if phaseStats is None:
+            phaseStats = self.phases[phase] = PhaseStats()
+        phaseStats.add(seconds, counters)
+        for hook in self.hooks:
+            hook(phase, seconds, counters)
+
+    def __getitem__(self, phase):
+        return self.phases[phase]
+
+    def reset(self):
+        self.phases = {}
+
+    def asDict(self):
+        return {phase: phaseStats.asDict() for phase, phaseStats in self.phases.items()}
+
+
+class PhaseStats(object):
+    '''
+    totals over every run of one phase, peakFrontier is the largest of any run
+
+    nodesVisited    users taken off the queue or walked
+    queuePushes     users put on the queue
+    cycleRounds     rootless cycles that had a root promoted
+    peakFrontier    largest number of users waiting on the queue at once
+    '''
+
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.nodesVisited = 0
+        self.queuePushes = 0
+        self.cycleRounds = 0
+        self.peakFrontier = 0
+
+    def add(self, seconds, counters):
+        self.calls += 1
+        self.seconds += seconds
+        self.nodesVisited += counters.get('nodesVisited', 0)
+        self.queuePushes += counters.get('queuePushes', 0)
+        self.cycleRounds += counters.get('cycleRounds', 0)
+        self.peakFrontier = max(self.peakFrontier, counters.get('peakFrontier', 0))
+
+    def asDict(self):
+        return dict(vars(self))
@@ -0,0 +1,60 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from collections import Counter
+
+
+DEFAULT_MEMORY_BUDGET = 64 * 2**20  #bytes of bitset history kept for reconstruction
+
+
+def closestSubsetSum(sizes, target, memoryBudget=DEFAULT_MEMORY_BUDGET):
+    '''
+    Chooses items from sizes (a list of positive ints) whose sum is as large as possible without exceeding target.
+    Returns (list of chosen positions in sizes, their sum), or None if the bitsets would not fit in memoryBudget.
+
+    The reachable sums are a bitset held in one big integer: bit s is set when some subset sums to s,
+    and adding an item of size w is reachable |= reachable << w. Equal sizes are grouped and each group is split
+    into chunks of 1, 2, 4, ... copies, so the number of shifts grows with the number of distinct sizes
+    rather than the number of items, which keeps hundreds of thousands of small components cheap.
+    The bitset after every chunk is kept so the chosen chunks can be read back afterwards.
+    '''
+    if target <= 0:
+        return [], 0
+
+    chunks = []     #list of (size, copies)
+    for size, count in sorted(Counter(size for size in sizes if size <= target).items()):
+        copies = 1
+        while count > 0:
+            take = min(copies, count)
+            chunks.append((size, take))
+            count -= take
+            copies *= 2
+
+    if len(chunks) * (target // 8 + 1) > memoryBudget:
+        return None
+
+    mask = (1 << (target + 1)) - 1
+    reachable = 1
+    history = []
+    for size, copies in chunks:
+        history.append(reachable)
+        reachable |= (reachable << (size * copies)) & mask
+
+    best = reachable.bit_length() - 1
+
+    #walk the chunks backwards: a chunk was used if the remaining sum was not reachable without it
+    used = Counter()
+    remaining = best
+    for (size, copies), before in zip(reversed(chunks), reversed(history)):
+        if not (before >> remaining) & 1:
+            used[size] += copies
+            remaining -= size * copies
+
+    chosen = []
+    for position, size in enumerate(sizes):
+        if used[size] > 0:
+            used[size] -= 1
+            chosen.append(position)
+    return chosen, best
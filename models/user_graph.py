@@ -5,15 +5,28 @@ Created on Sep 13, 2016
 '''
 from uuid import uuid4
 from _collections import defaultdict
-from queue import Queue
-from operator import itemgetter
+from collections import deque
+from bisect import bisect_left, bisect_right
+from array import array
+from time import perf_counter
+from models.components import ComponentIndex, sourceComponentRoots, limitWalk, takeWalk
+from models.csr_graph import CompiledCoachingGraph, nearestSize
+from models import partition, snapshot
+from models.user_store import UserStore
+from models.subset_sum import closestSubsetSum, DEFAULT_MEMORY_BUDGET
+from models.stats import InfectionStats
 
 class User(object):
     '''
     UUID is set when the user is created and does not change
     siteVersion may be set and changed at any time
     name represents any information attached to the user that does not affect infection
+    
+    Once the user is added to a CoachingGraph this object is only a handle: name, siteVersion and
+    subtreeSize are read from and written to the graph's UserStore columns.
+    Until then they are kept on the handle itself, so a User can still be used standalone.
     '''
+    __slots__ = ('UUID', '_store', '_slot', '_name', '_siteVersion', '_subtreeSize')
 
 
     def __init__(self, name, version=None):
@@ -21,12 +34,56 @@ class User(object):
         Constructor
         '''
         self.UUID = uuid4() #each user should have a unique ID
-        self.tutors = set()
-        self.name = name
+        self._store = None
+        self._slot = None
+        self._name = name
+        self._siteVersion = None
+        self._subtreeSize = None
         if version: self.setVersion(version)
         
+    def attach(self, store):
+        '''
+        moves the user's state into the store's columns
+        '''
+        self._slot = store.add(self.UUID, self._name, self._siteVersion)
+        self._store = store
+        self._name = self._siteVersion = self._subtreeSize = None
+        
+    def detach(self):
+        '''
+        takes the user's state back out of the store, when the user is removed from the graph
+        '''
+        self._name, self._siteVersion = self._store.names[self._slot], self._store.getVersion(self._slot)
+        self._store = self._slot = None
+        
+    @property
+    def name(self):
+        if self._store is None: return self._name
+        return self._store.names[self._slot]
+    
+    @name.setter
+    def name(self, name):
+        if self._store is None: self._name = name
+        else: self._store.names[self._slot] = name
+        
+    @property
+    def siteVersion(self):
+        if self._store is None: return self._siteVersion
+        return self._store.getVersion(self._slot)
+        
     def setVersion(self, version):
-        self.siteVersion = version
+        if self._store is None: self._siteVersion = version
+        else: self._store.setVersion(self._slot, version)
+        
+    @property
+    def subtreeSize(self):
+        if self._store is None: return self._subtreeSize
+        return self._store.subtreeSizes[self._slot]
+    
+    @subtreeSize.setter
+    def subtreeSize(self, size):
+        if self._store is None: self._subtreeSize = size
+        else: self._store.subtreeSizes[self._slot] = size
     
 class CoachingGraph(object):
     '''
@@ -38,19 +95,60 @@ class CoachingGraph(object):
     
     self.users is a dict of uuid:User
     self.coaches is a dict of uuid_of_coach:{uuids_of_coachees}
-    self.is_coached_by is a dict of uuid_of_coachee:[uuids_of_coaches[ 
+    self.is_coached_by is a dict of uuid_of_coachee:{uuids_of_coaches}
+    self.store is the UserStore holding the version and subtree size columns for every user
+    self.journal is the RolloutJournal recording changes to the graph, if one is attached
+    self.componentIndex tracks the connected components as users and relationships are added and removed
+    self.stats is the InfectionStats collecting timings and counters, if instrument() was called
+    
+    The spanning tree used by limited_infection lives in self.spanningIs_coached_by (dict of coacheeID:coachID)
+    and self.spanningCoaches (dict of coachID:{coacheeIDs}), hanging off self.virtualRootUser, which is not
+    one of self.users. Once built, it and the subtree sizes are patched as users and relationships are added.
+    self.generation counts changes to users and relationships, and the tree is only rebuilt when
+    self.spanningGeneration falls behind it. self.sizeIndex is the tree sorted by subtree size, dropped whenever
+    a size changes and rebuilt on the next selection.
+    
+    plan_total_infection and plan_limited_infection preview an infection without giving anyone a version.
+    self.plans memoizes their results, and is emptied whenever self.generation has moved past self.plansGeneration.
+    
+    For read-heavy work such as planning several rollouts, compile() builds an integer-indexed
+    CompiledCoachingGraph with the same infection methods, and freeze() an immutable FrozenCoachingGraph to share
+    between threads and worker processes
     '''
 
 
     def __init__(self):
         self.users = {}
         self.coaches = defaultdict(set)
-        self.is_coached_by = defaultdict(list)
+        self.is_coached_by = defaultdict(set)
+        self.virtualRootUser = None
+        self.spanningIs_coached_by = {}
+        self.spanningCoaches = defaultdict(set)
+        self.generation = 0
+        self.spanningGeneration = None
+        self.sizeIndex = None
+        self.store = UserStore()
+        self.componentIndex = ComponentIndex()
+        self.journal = None
+        self.stats = None
+        self.plans = {}
+        self.plansGeneration = None
             
     def addUser(self, newUser):
         if newUser.UUID in self.users.keys():
             raise GraphViolation('User with ID {} already exists.'.format(newUser.UUID))
+        if newUser._store is not None:
+            raise GraphViolation('User with ID {} already belongs to another graph.'.format(newUser.UUID))
+        newUser.attach(self.store)
+        self.componentIndex.add(newUser._slot)
         self.users[newUser.UUID] = newUser
+        treeIsCurrent = self.spanningGeneration == self.generation
+        self.generation += 1
+        if self.virtualRootUser is not None:
+            self._patchSpanningTree_user(newUser.UUID)
+            if treeIsCurrent: self.spanningGeneration = self.generation
+        if self.journal is not None:
+            self.journal.recordUsers([newUser])
         
     def addCoachingRelationship(self, coachID, coacheeID):
         for ID in [coachID, coacheeID]:
@@ -60,30 +158,519 @@ class CoachingGraph(object):
         if coachID == coacheeID:
             raise GraphViolation('Self-referential relationship')
             
+        if coacheeID in self.coaches.get(coachID, ()):
+            return  #already coached
             
         self.coaches[coachID].add(coacheeID)
-        self.is_coached_by[coacheeID].append(coachID)
-        
-    def total_infection(self, startingUserID, newVersionNumber):
-        infectedUsers = set()
-        processingQueue = Queue()
-        processingQueue.put(startingUserID)
-        while not processingQueue.empty():
-            currentID = processingQueue.get()
-            self.users[currentID].setVersion(newVersionNumber)
-            
-            #treat relations in both directions identically for infection
-            for userID in self.coaches[currentID]:
-                if userID in infectedUsers: continue
-                infectedUsers.add(userID)   #add users to infected list when they go on the queue to avoid duplicates
-                processingQueue.put(userID)
-                
-            for userID in self.is_coached_by[currentID]:
-                if userID in infectedUsers: continue
-                infectedUsers.add(userID)
-                processingQueue.put(userID)
+        self.is_coached_by[coacheeID].add(coachID)
+        self.componentIndex.union(self.store.index[coachID], self.store.index[coacheeID])
+        treeIsCurrent = self.spanningGeneration == self.generation
+        self.generation += 1
+        if self.virtualRootUser is not None:
+            self._patchSpanningTree_relationship(coachID, coacheeID)
+            if treeIsCurrent: self.spanningGeneration = self.generation
+        if self.journal is not None:
+            self.journal.recordRelationships([(coachID, coacheeID)])
+        
+    def addUsers(self, newUsers):
+        '''
+        Bulk version of addUser. Every user is validated before any is added, and all problems are reported
+        together in one GraphViolation whose violations are (row, message) pairs. Nothing is added if any row is bad.
+        '''
+        newUsers = list(newUsers)
+        violations = []
+        batchIDs = set()
+        for row, newUser in enumerate(newUsers):
+            if newUser.UUID in self.users or newUser.UUID in batchIDs:
+                violations.append((row, 'User with ID {} already exists.'.format(newUser.UUID)))
+            elif newUser._store is not None:
+                violations.append((row, 'User with ID {} already belongs to another graph.'.format(newUser.UUID)))
+            batchIDs.add(newUser.UUID)
+        if violations:
+            raise GraphViolation.fromViolations('users', violations)
+        
+        treeIsCurrent = self.spanningGeneration == self.generation
+        for newUser in newUsers:
+            newUser.attach(self.store)
+            self.componentIndex.add(newUser._slot)
+            self.users[newUser.UUID] = newUser
+            if self.virtualRootUser is not None:
+                self._patchSpanningTree_user(newUser.UUID)
+        self.generation += 1
+        if self.virtualRootUser is not None and treeIsCurrent:
+            self.spanningGeneration = self.generation
+        if self.journal is not None:
+            self.journal.recordUsers(newUsers)
+        
+    def addCoachingRelationships(self, relationships):
+        '''
+        Bulk version of addCoachingRelationship, taking (coachID, coacheeID) pairs.
+        All pairs are checked in one pass first, and unknown users and self references are reported together in one
+        GraphViolation whose violations are (row, message) pairs; nothing is added if any row is bad.
+        Relationships that already exist, or repeat within the batch, are dropped.
+        
+        The spanning tree is not patched edge by edge: a bulk load is usually large enough that rebuilding it on
+        the next limited_infection is cheaper.
+        '''
+        violations = []
+        newRelationships = defaultdict(set)  #dict of coachID:{coacheeIDs} for the relationships to add
+        for row, (coachID, coacheeID) in enumerate(relationships):
+            missingIDs = [ID for ID in (coachID, coacheeID) if ID not in self.users]
+            if missingIDs:
+                violations.append((row, 'User with ID {} does not exist.'.format(missingIDs[0])))
+            elif coachID == coacheeID:
+                violations.append((row, 'Self-referential relationship'))
+            elif coacheeID not in self.coaches.get(coachID, ()):
+                newRelationships[coachID].add(coacheeID)
+        if violations:
+            raise GraphViolation.fromViolations('relationships', violations)
+        
+        index = self.store.index
+        union = self.componentIndex.union
+        for coachID, coacheeIDs in newRelationships.items():
+            self.coaches[coachID].update(coacheeIDs)
+            coachSlot = index[coachID]
+            for coacheeID in coacheeIDs:
+                self.is_coached_by[coacheeID].add(coachID)
+                union(coachSlot, index[coacheeID])
+        if newRelationships:
+            self.generation += 1
+            if self.journal is not None:
+                self.journal.recordRelationships([(coachID, coacheeID) for coachID, coacheeIDs in newRelationships.items() for coacheeID in coacheeIDs])
+        
+    def removeCoachingRelationship(self, coachID, coacheeID):
+        '''
+        O(coaches of the coachee) plus the depth of the spanning tree if the relationship was a tree edge,
+        plus the component repair, see _splitApart
+        '''
+        if coacheeID not in self.coaches.get(coachID, ()):
+            raise GraphViolation('User with ID {} does not coach user with ID {}.'.format(coachID, coacheeID))
+        
+        self._unlink(coachID, coacheeID)
+        self._splitApart([coachID, coacheeID])
+        treeIsCurrent = self.spanningGeneration == self.generation
+        self.generation += 1
+        if self.virtualRootUser is not None:
+            self._patchSpanningTree_removedRelationship(coachID, coacheeID)
+            if treeIsCurrent: self.spanningGeneration = self.generation
+        if self.journal is not None:
+            self.journal.recordRemovedRelationships([(coachID, coacheeID)])
+        
+    def removeUser(self, userID):
+        '''
+        Removes the user and every relationship it is part of, in O(relationships of the user) plus the spanning tree
+        depth for each of its tree edges. With more than one neighbour, what is left of its component may fall apart,
+        see _splitApart for the cost of finding the pieces. The User object is detached and keeps its name and version.
+        Its store slot is tombstoned rather than reused, so the slots of the other users do not move, see compact.
+        '''
+        if userID not in self.users:
+            raise GraphViolation('User with ID {} does not exist.'.format(userID))
+        
+        treeIsCurrent = self.spanningGeneration == self.generation
+        relationships = [(userID, coacheeID) for coacheeID in self.coaches.get(userID, ())]
+        relationships += [(coachID, userID) for coachID in self.is_coached_by.get(userID, ())]
+        for coachID, coacheeID in relationships:
+            self._unlink(coachID, coacheeID)
+            if self.virtualRootUser is not None:
+                self._patchSpanningTree_removedRelationship(coachID, coacheeID)
+        if self.virtualRootUser is not None:
+            self._patchSpanningTree_removedUser(userID)
+        if relationships:
+            self.componentIndex.split([self.store.index[userID]])
+            neighbourIDs = list({ID for relationship in relationships for ID in relationship if ID != userID})
+            if len(neighbourIDs) > 1:   #a single neighbour keeps the rest of the component together
+                self._splitApart(neighbourIDs)
+        
+        removedUser = self.users.pop(userID)
+        slot = removedUser._slot
+        removedUser.detach()
+        self.store.remove(slot)
+        self.generation += 1
+        if self.virtualRootUser is not None and treeIsCurrent:
+            self.spanningGeneration = self.generation
+        if self.journal is not None:
+            self.journal.recordRemovedUsers([userID])
+        
+    def _unlink(self, coachID, coacheeID):
+        '''
+        drops a relationship from both adjacency dicts, and the entries that become empty with it
+        '''
+        coacheeIDs = self.coaches[coachID]
+        coacheeIDs.discard(coacheeID)
+        if not coacheeIDs:
+            del self.coaches[coachID]
+        coachIDs = self.is_coached_by[coacheeID]
+        coachIDs.discard(coachID)
+        if not coachIDs:
+            del self.is_coached_by[coacheeID]
+        
+    def compact(self):
+        '''
+        Frees the slots of removed users. They are tombstoned, never reused, so under constant churn they pile up
+        in the store columns, the component index, every compiled graph and every snapshot, where each is also a
+        spanning tree root of its own. Run this once self.store.removed is a sizeable share of len(self.store),
+        e.g. after a term's leavers are removed or as part of nightly maintenance. O(users + relationships).
+        
+        The users move to a new UserStore with their slots renumbered in order; the User handles, the listeners
+        (an attached journal) and the staged layers move with them. Compiled graphs built before keep the old
+        store and slots, compile again to follow the graph.
+        '''
+        if not self.store.removed:
+            return
+        store, newSlots = self.store.compacted()
+        for user in self.users.values():
+            user._store, user._slot = store, newSlots[user._slot]
+        self.componentIndex = self.componentIndex.renumbered(newSlots)
+        self.store = store
+        
+    def _splitApart(self, startIDs):
+        '''
+        Repairs the component index after relationships are removed from a component, startIDs being distinct users
+        that were in it and may no longer be connected. A breadth first search runs from each of them, taking one
+        relationship at a time in turn. A search that reaches a user reached by another one is connected to it, so it
+        stops and leaves the rest to the other. A search that runs out of relationships has found a whole piece,
+        which is split off. Once a single search is left, what it has not split off stays in the old component.
+        
+        As every search stops with the piece it explores, this costs about len(startIDs) times the relationships of
+        the second largest piece (of the smaller side, for the two ends of a relationship), never the whole component
+        unless it really falls into pieces of about equal size.
+        '''
+        index, componentIndex = self.store.index, self.componentIndex
+        joined = list(range(len(startIDs)))   #search:search it stopped in favour of, itself while running
+        def running(search):
+            while joined[search] != search:
+                joined[search] = joined[joined[search]]
+                search = joined[search]
+            return search
+        reached = [{startID} for startID in startIDs]
+        owner = {startID: search for search, startID in enumerate(startIDs)}   #dict of userID:first search to reach it
+        searches = {search: self._searchFrom(startID, reached[search]) for search, startID in enumerate(startIDs)}
+        while len(searches) > 1:
+            for search, walk in list(searches.items()):
+                if len(searches) == 1:
+                    break
+                neighbourID = next(walk, None)
+                if neighbourID is None:
+                    del searches[search]
+                    componentIndex.split([index[ID] for ID in reached[search]])
+                    continue
+                other = running(owner.setdefault(neighbourID, search))
+                if other != search:
+                    joined[search] = other
+                    del searches[search]
+        
+    def _searchFrom(self, startID, reached):
+        '''
+        breadth first search from startID in both directions, adding the users it reaches to reached
+        and yielding the far end of every relationship it goes through
+        '''
+        coaches, is_coached_by = self.coaches, self.is_coached_by
+        queue = deque([startID])
+        while queue:
+            userID = queue.popleft()
+            for neighbours in (coaches.get(userID, ()), is_coached_by.get(userID, ())):
+                for neighbourID in neighbours:
+                    if neighbourID not in reached:
+                        reached.add(neighbourID)
+                        queue.append(neighbourID)
+                    yield neighbourID
+        
+    def _spanningUser(self, userID):
+        '''
+        the virtual root does not have to be in self.users
+        '''
+        if userID == self.virtualRootUser.UUID:
+            return self.virtualRootUser
+        return self.users[userID]
+    
+    def _patchSpanningTree_user(self, userID):
+        '''
+        a new user has no relationships yet, so it is a root of its own: a leaf of the virtual root
+        '''
+        rootID = self.virtualRootUser.UUID
+        self.spanningIs_coached_by[userID] = rootID
+        self.spanningCoaches[rootID].add(userID)
+        self.users[userID].subtreeSize = 1
+        if self.virtualRootUser.subtreeSize is not None:
+            self.virtualRootUser.subtreeSize += 1
+        self.sizeIndex = None
+    
+    def _patchSpanningTree_relationship(self, coachID, coacheeID):
+        '''
+        Keeps the existing spanning tree and subtree sizes valid after a coaching relationship is added.
+        If the coachee already has a coach in the tree the new relationship is simply not a tree edge.
+        If the coachee hangs off the virtual root, its whole subtree is moved under the new coach, unless the
+        coach is inside that subtree (a new cycle). Only the sizes on the coach's ancestor path change,
+        the virtual root keeps its size as it counted the moved subtree before as well.
+        '''
+        rootID = self.virtualRootUser.UUID
+        if self.spanningIs_coached_by.get(coacheeID) != rootID:
+            return
+        
+        ancestorIDs = []
+        currentID = coachID
+        while currentID != rootID:
+            if currentID == coacheeID:
+                return
+            ancestorIDs.append(currentID)
+            currentID = self.spanningIs_coached_by[currentID]
+        
+        self.spanningCoaches[rootID].discard(coacheeID)
+        self.spanningCoaches[coachID].add(coacheeID)
+        self.spanningIs_coached_by[coacheeID] = coachID
+        size = self.users[coacheeID].subtreeSize
+        if size is not None:
+            for ancestorID in ancestorIDs:
+                self.users[ancestorID].subtreeSize += size
+        self.sizeIndex = None
+        
+    def _patchSpanningTree_removedRelationship(self, coachID, coacheeID):
+        '''
+        Keeps the spanning tree and subtree sizes valid after a coaching relationship is removed.
+        Only a tree edge matters: the coachee's subtree is taken off the old coach's ancestor path and hung
+        under another of the coachee's coaches that is not inside the subtree, or under the virtual root if there
+        is none (the coachee has lost its last coach, or is left in a rootless cycle).
+        '''
+        if self.spanningIs_coached_by.get(coacheeID) != coachID:
+            return
+        rootID = self.virtualRootUser.UUID
+        size = self.users[coacheeID].subtreeSize
+        self._discardSpanningChild(coachID, coacheeID)
+        if size is not None:
+            for ancestorID in self._spanningAncestors(coachID):
+                self.users[ancestorID].subtreeSize -= size
+        
+        newCoachID = rootID
+        for candidateID in self.is_coached_by.get(coacheeID, ()):
+            if coacheeID not in self._spanningAncestors(candidateID):
+                newCoachID = candidateID
+                break
+        self.spanningIs_coached_by[coacheeID] = newCoachID
+        self.spanningCoaches[newCoachID].add(coacheeID)
+        if size is not None and newCoachID != rootID:
+            for ancestorID in self._spanningAncestors(newCoachID):
+                self.users[ancestorID].subtreeSize += size
+        self.sizeIndex = None
+        
+    def _patchSpanningTree_removedUser(self, userID):
+        '''
+        once its relationships are gone the user is a leaf of the virtual root, which loses one from its size
+        '''
+        if self.spanningIs_coached_by.pop(userID, None) is None:
+            return
+        self._discardSpanningChild(self.virtualRootUser.UUID, userID)
+        if self.virtualRootUser.subtreeSize is not None:
+            self.virtualRootUser.subtreeSize -= 1
+        self.sizeIndex = None
+        
+    def _discardSpanningChild(self, coachID, coacheeID):
+        coacheeIDs = self.spanningCoaches.get(coachID)
+        if coacheeIDs is not None:
+            coacheeIDs.discard(coacheeID)
+            if not coacheeIDs:
+                del self.spanningCoaches[coachID]
+        
+    def _spanningAncestors(self, userID):
+        '''
+        userID and its ancestors in the spanning tree, up to but excluding the virtual root
+        '''
+        rootID = self.virtualRootUser.UUID
+        ancestorIDs = []
+        currentID = userID
+        while currentID is not None and currentID != rootID:
+            ancestorIDs.append(currentID)
+            currentID = self.spanningIs_coached_by.get(currentID)
+        return ancestorIDs
+        
+    def compile(self):
+        '''
+        freezes the current users and relationships into CSR arrays, see CompiledCoachingGraph
+        the UserStore is shared, so infecting through the compiled graph updates the same users
+        '''
+        return CompiledCoachingGraph.fromGraph(self)
+        
+    def freeze(self):
+        '''
+        an immutable copy of the graph as it is now, safe to share between threads and processes,
+        see models.frozen_graph.FrozenCoachingGraph
+        '''
+        from models.frozen_graph import FrozenCoachingGraph    #imported here, it imports this module
+        return FrozenCoachingGraph.fromGraph(self)
+        
+    def save(self, path, includeSpanningTree=True):
+        '''
+        writes a versioned binary snapshot of the compiled graph, see models.snapshot
+        '''
+        snapshot.save(self.compile(), path, includeSpanningTree)
+        
+    @staticmethod
+    def load(path, mmap=True):
+        '''
+        loads a snapshot written by save as a CompiledCoachingGraph backed by the (memory-mapped) file
+        '''
+        return snapshot.load(path, mmap)
+        
+    def componentSize(self, userID):
+        '''
+        number of users connected to userID in either direction, including the user itself
+        '''
+        return self.componentIndex.size(self.store.index[userID])
+    
+    def countVersion(self, version):
+        '''
+        number of users on version, including a staged one, in O(1) (see UserStore.countVersion)
+        '''
+        return self.store.countVersion(version)
+    
+    def usersOnVersion(self, version):
+        '''
+        the IDs of the users on version, in O(users returned)
+        '''
+        ids = self.store.ids
+        return [ids[slot] for slot in self.store.slotsWithVersion(version)]
+    
+    def versionCounts(self):
+        '''
+        dict of version:number of users on it
+        '''
+        return self.store.versionCounts()
+    
+    def components(self):
+        '''
+        yields the connected components as lists of user IDs
+        '''
+        ids = self.store.ids
+        componentIndex = self.componentIndex
+        for root in componentIndex.roots():
+            if ids[root] is not None:   #a removed user
+                yield [ids[slot] for slot in componentIndex.members(root)]
+        
+    def total_infection(self, startingUserID, newVersionNumber, max_users=None, max_hops=None):
+        '''
+        Relations in both directions are treated identically for infection, so the infected users are
+        exactly the connected component of the starting user. Without a budget the component index already
+        knows its members, so this is a single bulk write with no traversal.
         
+        With a budget the component is walked breadth first from the starting user (see iter_infection) and the
+        walk stops as soon as max_users users are reached or the next user is more than max_hops relationships
+        away, so a capped infection of a huge component only costs about as much as the cap.
+        Returns (infected, fullyCovered): the number of users infected and whether that was the whole component
+        '''
+        if startingUserID not in self.users:
+            raise GraphViolation('User with ID {} does not exist.'.format(startingUserID))
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        if max_users is None and max_hops is None:
+            members = self.componentIndex.members(self.store.index[startingUserID])
+            fullyCovered = True
+        else:
+            members, fullyCovered = takeWalk(self._walkInfection(startingUserID), max_users, max_hops)
+            index = self.store.index
+            members = [index[userID] for userID in members]
+        members = list(members)
+        self.store.setVersions(members, newVersionNumber)
+        if stats is not None:
+            stats.record('total_infection', start, nodesVisited=len(members))
+        return len(members), fullyCovered
+        
+    def iter_infection(self, startingUserID, max_users=None, max_hops=None):
+        '''
+        Lazily yields the IDs of the users total_infection would reach from startingUserID, in breadth first order
+        starting with startingUserID itself, without changing any version. Stops after max_users users or once
+        the users left are more than max_hops relationships away; the walk goes no further than what is consumed.
+        '''
+        return limitWalk(self._walkInfection(startingUserID), max_users, max_hops)
+        
+    def _walkInfection(self, startingUserID):
+        '''
+        yields (userID, hops from the starting user), a user is yielded as soon as it is discovered
+        '''
+        if startingUserID not in self.users:
+            raise GraphViolation('User with ID {} does not exist.'.format(startingUserID))
+        coaches, is_coached_by = self.coaches, self.is_coached_by
+        visited = {startingUserID}
+        frontier = [startingUserID]
+        hops = 0
+        yield startingUserID, hops
+        while frontier:
+            hops += 1
+            nextFrontier = []
+            for userID in frontier:
+                #treat relations in both directions identically for infection
+                for neighbours in (coaches.get(userID, ()), is_coached_by.get(userID, ())):
+                    for neighbourID in neighbours:
+                        if neighbourID not in visited:
+                            visited.add(neighbourID)
+                            nextFrontier.append(neighbourID)
+                            yield neighbourID, hops
+            frontier = nextFrontier
 
+    def total_infection_many(self, seedIDs, newVersionNumber):
+        '''
+        total_infection from every seed at once: each component is infected once however many seeds it holds,
+        and all the users are written in a single bulk assignment.
+        Returns (attribution, total): attribution is a dict of seedID:users infected on its behalf, where a seed
+        whose component was already reached by an earlier seed gets 0, and total is the number of users infected
+        '''
+        seedIDs = list(seedIDs)
+        for seedID in seedIDs:
+            if seedID not in self.users:
+                raise GraphViolation('User with ID {} does not exist.'.format(seedID))
+        index, componentIndex = self.store.index, self.componentIndex
+        attribution = {}
+        reachedRoots = set()
+        infectedSlots = []
+        for seedID in seedIDs:
+            slot = index[seedID]
+            root = componentIndex.find(slot)
+            if root in reachedRoots:
+                attribution.setdefault(seedID, 0)
+                continue
+            reachedRoots.add(root)
+            before = len(infectedSlots)
+            infectedSlots.extend(componentIndex.members(slot))
+            attribution[seedID] = len(infectedSlots) - before
+        
+        self.store.setVersions(infectedSlots, newVersionNumber)
+        return attribution, len(infectedSlots)
+        
+    def instrument(self, hook=None):
+        '''
+        Starts recording the wall time and counters of every infection phase in a new InfectionStats,
+        which is returned. hook, if given, is called as hook(phase, seconds, counters) as each phase ends.
+        While no stats are attached every phase only pays for an "is None" check.
+        '''
+        self.stats = InfectionStats()
+        if hook is not None:
+            self.stats.hooks.append(hook)
+        return self.stats
+        
+    def uninstrument(self):
+        self.stats = None
+        
+    def stage(self):
+        '''
+        Starts a staged rollout: until it is committed or discarded, every version change (infections and
+        User.setVersion alike) goes into a sparse overlay instead of the users, and reads see the overlay first.
+        Stages can be nested. This lets several candidate plans be tried and compared with stagedDiff in memory.
+        '''
+        self.store.stage()
+        
+    def commitStage(self):
+        '''
+        applies the innermost stage, to the stage around it or to the users
+        '''
+        self.store.commit()
+        
+    def discardStage(self):
+        self.store.discard()
+        
+    def stagedDiff(self):
+        '''
+        the users whose version the innermost stage changes, as a dict of (oldVersion, newVersion):[userIDs]
+        '''
+        return self.store.diff()
+        
     def limited_infection(self, newVersionNumber, numberToInfect):
         '''
         This algorithm is based on the intuition that our graph will look a lot like a tree.
@@ -101,30 +688,107 @@ class CoachingGraph(object):
         3. Traverse the tree, assigning to each node the number of nodes in the subtree rooted at that node
         4. Select the subtree whose size is nearest to the number of desired infections
         5. Infect that subtree
+        
+        Steps 1 to 3 are cached on the graph (see updateSpanningTree), so planning several rollouts on an
+        unchanged graph only pays for steps 4 and 5
         '''
-        self.virtualRootUser = User('Virtual Root')
-        self.users[self.virtualRootUser.UUID] = self.virtualRootUser
-        self.spanningIs_coached_by = {} #dict of coacheeID:coachID
-        self.spanningCoaches = defaultdict(set) #dict of coachID:{coacheeIDs}
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        self.updateSpanningTree()
+        rootID = self.selectSubtree(numberToInfect)
+        if rootID is not None:
+            self.infectSubtree(newVersionNumber, rootID)
+        if stats is not None:
+            stats.record('limited_infection', start)
         
-        self.getSpanningTree()
-        self.setSubtreeSizes(self.virtualRootUser.UUID)
-        self.infectSubtree(newVersionNumber, self.selectSubtree(numberToInfect))
+    def plan_total_infection(self, startingUserID, max_users=None, max_hops=None):
+        '''
+        the frozenset of user IDs total_infection would infect with the same arguments, no version is changed
+        '''
+        if startingUserID not in self.users:
+            raise GraphViolation('User with ID {} does not exist.'.format(startingUserID))
+        key = ('total', startingUserID, max_users, max_hops)
+        plan = self._cachedPlan(key)
+        if plan is None:
+            if max_users is None and max_hops is None:
+                ids = self.store.ids
+                plan = frozenset(ids[slot] for slot in self.componentIndex.members(self.store.index[startingUserID]))
+            else:
+                plan = frozenset(self.iter_infection(startingUserID, max_users, max_hops))
+            self.plans[key] = plan
+        return plan
+        
+    def plan_limited_infection(self, numberToInfect):
+        '''
+        The frozenset of user IDs limited_infection would infect, no version is changed.
+        Only the cached spanning tree and subtree sizes may be brought up to date on the way.
+        '''
+        key = ('limited', numberToInfect)
+        plan = self._cachedPlan(key)
+        if plan is None:
+            self.updateSpanningTree()
+            rootID = self.selectSubtree(numberToInfect)
+            subtreeIDs = [rootID] if rootID is not None else []
+            for currentUserID in subtreeIDs:
+                subtreeIDs.extend(self.spanningCoaches.get(currentUserID, ()))
+            plan = frozenset(ID for ID in subtreeIDs if ID in self.users)
+            self.plans[key] = plan
+        return plan
         
-    def limited_infection_exact(self, newVersionNumber, numberToInfect):
+    def _cachedPlan(self, key):
         '''
-        not finished implementing, not tested
+        the memoized plan for key, or None; plans only depend on users and relationships, so they stay valid
+        until the generation changes
         '''
-        self.virtualRootUser = User('Virtual Root')
-        self.users[self.virtualRootUser.UUID] = self.virtualRootUser
+        if self.plansGeneration != self.generation:
+            self.plans = {}
+            self.plansGeneration = self.generation
+        return self.plans.get(key)
+        
+    def limited_infection_exact(self, newVersionNumber, numberToInfect, memoryBudget=DEFAULT_MEMORY_BUDGET):
+        '''
+        Like limited_infection, but infects a set of disjoint subtrees whose sizes add up to exactly numberToInfect
+        where possible, see selectSubtree_exact. Returns the number of users infected.
+        '''
+        self.updateSpanningTree()
+        rootIDs = self.selectSubtree_exact(numberToInfect, memoryBudget)
+        for rootID in rootIDs:
+            self.infectSubtree(newVersionNumber, rootID)
+        return sum(self._spanningUser(rootID).subtreeSize for rootID in rootIDs)
+        
+    def selectPartition(self, targetSize, tolerance=partition.DEFAULT_TOLERANCE, rounds=partition.DEFAULT_ROUNDS, seed=0):
+        '''
+        An alternative to the spanning subtrees: about targetSize users (within tolerance * targetSize) chosen to cut
+        as few coaching relationships as possible, counting every relationship and not just those in the spanning tree.
+        Returns (userIDs, number of relationships cut), see models.partition.selectPartition.
+        '''
+        slots, cut = partition.selectPartition(self.compile(), targetSize, tolerance, rounds, seed)
+        ids = self.store.ids
+        return [ids[slot] for slot in slots], cut
+        
+    def limited_infection_partitioned(self, newVersionNumber, numberToInfect, tolerance=partition.DEFAULT_TOLERANCE,
+                                      rounds=partition.DEFAULT_ROUNDS, seed=0):
+        '''
+        Infects the users chosen by selectPartition. Returns (number of users infected, number of relationships cut)
+        '''
+        slots, cut = partition.selectPartition(self.compile(), numberToInfect, tolerance, rounds, seed)
+        self.store.setVersions(slots, newVersionNumber)
+        return len(slots), cut
+        
+    def updateSpanningTree(self):
+        '''
+        rebuilds the spanning tree and subtree sizes unless they are still valid for the current generation
+        '''
+        if self.spanningGeneration == self.generation:
+            return
+        if self.virtualRootUser is None:
+            self.virtualRootUser = User('Virtual Root')
         self.spanningIs_coached_by = {} #dict of coacheeID:coachID
         self.spanningCoaches = defaultdict(set) #dict of coachID:{coacheeIDs}
         
         self.getSpanningTree()
         self.setSubtreeSizes(self.virtualRootUser.UUID)
-        for s in self.selectSubtree_exact(numberToInfect):
-            self.infectSubtree(newVersionNumber, s)
-        
+        self.spanningGeneration = self.generation
 
     def getSpanningTree(self):
         '''
@@ -134,104 +798,196 @@ class CoachingGraph(object):
         So we are preserving the coach-coachee relationship in the spanning tree, which may not result in a strictly minimal
         spanning tree
         I am also joining the roots to the virtual master root as soon as they are identified for convenience
+        The whole build is O(users + relationships)
         '''
-        rootUserIDs = self.users.keys() - self.is_coached_by.keys() - {self.virtualRootUser.UUID} #root users are users that are not coachees
-#         print('RR', rootUserIDs)
-        processingQueue = Queue()
-        for rootUserID in rootUserIDs:
-            processingQueue.put(rootUserID)
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        virtualRootID = self.virtualRootUser.UUID
+        coaches = self.coaches
+        def coacheesOf(userID):
+            return coaches.get(userID, ())
         
-        while not processingQueue.empty():
-            currentUserID = processingQueue.get()
-#             print(currentUserID)
-            if currentUserID in self.spanningIs_coached_by.keys():
-                continue
-            elif currentUserID in rootUserIDs:
-                self.spanningIs_coached_by[currentUserID] = self.virtualRootUser.UUID
-                self.spanningCoaches[self.virtualRootUser.UUID].add(currentUserID)
-            else:
-                self.spanningIs_coached_by[currentUserID] = self.is_coached_by[currentUserID][0]
-                self.spanningCoaches[self.is_coached_by[currentUserID][0]].add(currentUserID)
-                
-            for coacheeID in self.coaches[currentUserID]:
-                processingQueue.put(coacheeID)
-                
         '''
-        handling rootless cycles
+        Choosing the roots
+        Users without coaches are roots. Rootless cycles (a group of users who all coach each other, directly or not,
+        with no coach from outside the group) have no such user, so one user from each is promoted to a root.
+        Both are exactly the source components of the strongly connected components of the coaching graph,
+        so one linear Tarjan pass finds every root however many cycles there are.
         '''
-        unhandled = self.users.keys() - self.spanningIs_coached_by.keys() - {self.virtualRootUser.UUID}
-        while len(unhandled) > 0:           #So long as there are users not in the tree
-            newRoot = list(unhandled)[0]    #semirandomly select a root user from the rootless subgraph
-            processingQueue = Queue()       #build from the root as before
-            processingQueue.put(newRoot)
-            while not processingQueue.empty():
-                currentUserID = processingQueue.get()
-                if currentUserID in self.spanningIs_coached_by.keys():
-                    continue
-                elif currentUserID == newRoot:
-                    self.spanningIs_coached_by[newRoot] = self.virtualRootUser.UUID #attach it to the virtual root
-                    self.spanningCoaches[self.virtualRootUser.UUID].add(newRoot)
-                else:
-                    self.spanningIs_coached_by[currentUserID] = self.is_coached_by[currentUserID][0]
-                    self.spanningCoaches[self.is_coached_by[currentUserID][0]].add(currentUserID)
-                
-                for coacheeID in self.coaches[currentUserID]:
-                    processingQueue.put(coacheeID)
-                    
-            unhandled = self.users.keys() - self.spanningIs_coached_by.keys() - {self.virtualRootUser.UUID}
+        rootUserIDs = sourceComponentRoots((ID for ID in self.users if ID != virtualRootID), coacheesOf)
+        
+        '''
+        A single breadth first search from all the roots at once, every user hangs off the coach that reached it first.
+        Users are marked as placed when they are queued, so nobody is queued twice.
+        '''
+        spanningIs_coached_by, spanningCoaches = self.spanningIs_coached_by, self.spanningCoaches
+        for rootUserID in rootUserIDs:
+            spanningIs_coached_by[rootUserID] = virtualRootID
+        spanningCoaches[virtualRootID].update(rootUserIDs)
+        processingQueue = deque(rootUserIDs)
+        peakFrontier = len(processingQueue)
+        pops = 0
+        while processingQueue:
+            currentUserID = processingQueue.popleft()
+            pops += 1
+            for coacheeID in coacheesOf(currentUserID):
+                if coacheeID not in spanningIs_coached_by:
+                    spanningIs_coached_by[coacheeID] = currentUserID
+                    spanningCoaches[currentUserID].add(coacheeID)
+                    processingQueue.append(coacheeID)
+            if len(processingQueue) > peakFrontier:
+                peakFrontier = len(processingQueue)
+        
+        if stats is not None:
+            cycleRounds = sum(1 for rootUserID in rootUserIDs if self.is_coached_by.get(rootUserID))
+            stats.record('getSpanningTree', start, nodesVisited=pops, queuePushes=pops,
+                         cycleRounds=cycleRounds, peakFrontier=peakFrontier)
 
 
     def setSubtreeSizes(self, rootID):
         '''
         adding subtree sizes
-        this method is called recursively to do a post-order depth-first traversal of the spanning tree
+        this is a post-order traversal of the spanning tree done without recursion, so it copes with
+        arbitrarily long coaching chains: the tree is listed top-down, then sizes are summed bottom-up
         '''
-        size = 1
-        for childID in self.spanningCoaches[rootID]:
-            self.setSubtreeSizes(childID)
-            size += self.users[childID].subtreeSize
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        orderedIDs = [rootID]
+        for currentID in orderedIDs:    #the list grows as it is walked, giving a breadth first order
+            orderedIDs.extend(self.spanningCoaches.get(currentID, ()))
         
-        self.users[rootID].subtreeSize = size
+        sizes = {}
+        for currentID in reversed(orderedIDs):
+            size = 1
+            for childID in self.spanningCoaches.get(currentID, ()):
+                size += sizes[childID]
+            sizes[currentID] = size
+            self._spanningUser(currentID).subtreeSize = size
+        self.sizeIndex = None
+        if stats is not None:
+            stats.record('setSubtreeSizes', start, nodesVisited=len(orderedIDs))
         
-                
     def selectSubtree(self, targetSize):
-        ordered = sorted([(user.UUID, user.subtreeSize) for user in self.users.values()], key=itemgetter(1))
-        prevSize = 0
-        prevID = None
-        for ID, size in ordered: #TODO: make this a O(log n) search
-            if size < targetSize:
-                prevSize = size
-                prevID = ID
-            elif size == targetSize:
-                return ID
-            else:   #prevSize < targetSize < size
-                if targetSize - prevSize > size - targetSize:
-                    return ID
-                else:
-                    return prevID
+        '''
+        returns the root of the subtree whose size is nearest to targetSize, the smaller one on a tie
+        a binary search on the size index, which is only rebuilt after the sizes change
+        '''
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        sizes, orderedIDs = self.getSizeIndex()
+        rootID = self._nearestSubtree(sizes, orderedIDs, targetSize, bisect_left(sizes, targetSize))
+        if stats is not None:
+            stats.record('selectSubtree', start)
+        return rootID
+        
+    def selectSubtrees(self, targetSizes):
+        '''
+        answers many target sizes at once, returning one root per target in the same order
+        the targets are handled in ascending order, so each search starts where the previous one ended
+        '''
+        sizes, orderedIDs = self.getSizeIndex()
+        selected = [None] * len(targetSizes)
+        i = 0
+        for position, targetSize in sorted(enumerate(targetSizes), key=lambda item: item[1]):
+            i = bisect_left(sizes, targetSize, i)
+            selected[position] = self._nearestSubtree(sizes, orderedIDs, targetSize, i)
+        return selected
+    
+    def _nearestSubtree(self, sizes, orderedIDs, targetSize, i):
+        '''
+        i is the position of the first subtree at least as large as targetSize, see nearestSize
+        '''
+        position = nearestSize(sizes, targetSize, i)
+        return orderedIDs[position] if position is not None else None
+    
+    def getSizeIndex(self):
+        '''
+        the nodes of the spanning tree, virtual root included, sorted by subtree size
+        returns (array of sizes, list of IDs), both in ascending size order
+        '''
+        if self.sizeIndex is None:
+            index, subtreeSizes = self.store.index, self.store.subtreeSizes
+            orderedIDs = sorted(self.spanningIs_coached_by.keys(), key=lambda ID: subtreeSizes[index[ID]])
+            sizes = array('q', (subtreeSizes[index[ID]] for ID in orderedIDs))
+            orderedIDs.append(self.virtualRootUser.UUID)    #always the largest
+            sizes.append(self.virtualRootUser.subtreeSize - 1)  #it infects every user, but is not one itself
+            self.sizeIndex = (sizes, orderedIDs)
+        return self.sizeIndex
                 
-    def selectSubtree_exact(self, targetSize):
+    def selectSubtree_exact(self, targetSize, memoryBudget=DEFAULT_MEMORY_BUDGET):
+        '''
+        Returns the roots of disjoint subtrees whose sizes add up to targetSize, or failing that to the closest
+        total below it.
+        
+        The children of the virtual root are disjoint and cover every user, so first a bitset subset sum picks
+        whole trees of the spanning forest (see closestSubsetSum). Cutting classrooms along component lines is the
+        nicest partition we can get, so this is tried before anything else.
+        Any gap left over is filled greedily: search through the subtrees in largest-to-smallest order, taking
+        the largest one that fits in the difference and is not already covered, until the target is hit or the
+        subtrees run out. The greedy pass is also the fallback when the bitset would exceed memoryBudget bytes.
         '''
-        not implemented
-        implementation idea: search through the subtrees in largest-to-smallest order, finding the largest tree that 
-        fits in the difference and adding them until you run out of subtrees or hit the target value.
-        This hould work as there are usually many leaves to the spanning tree, but it may not be a very desirable solution.
+        rootIDs = list(self.spanningCoaches.get(self.virtualRootUser.UUID, ()))
+        result = closestSubsetSum([self._spanningUser(rootID).subtreeSize for rootID in rootIDs], targetSize, memoryBudget)
+        if result is None:
+            chosenIDs, total = [], 0
+        else:
+            chosenIDs, total = [rootIDs[i] for i in result[0]], result[1]
+        return chosenIDs + self._fillGreedily(targetSize - total, chosenIDs)
         
-        Also we should switch to a O(log n) search rather than the linear search we are currently using in limited infection
-        ''' 
+    def _fillGreedily(self, remaining, coveredRootIDs):
+        '''
+        picks uncovered subtrees largest first while they fit in remaining
+        the subtrees under an already chosen root are covered, and since a subtree is always larger than any
+        subtree inside it, walking in descending size order means we never pick one that contains a chosen one
+        '''
+        covered = set()
+        def cover(rootID):
+            subtreeIDs = [rootID]
+            for currentID in subtreeIDs:
+                subtreeIDs.extend(self.spanningCoaches.get(currentID, ()))
+            covered.update(subtreeIDs)
+        for rootID in coveredRootIDs:
+            cover(rootID)
+        
+        sizes, orderedIDs = self.getSizeIndex()
+        chosenIDs = []
+        i = bisect_right(sizes, remaining) - 1
+        while remaining > 0 and i >= 0:
+            ID = orderedIDs[i]
+            if ID not in covered and ID != self.virtualRootUser.UUID:
+                chosenIDs.append(ID)
+                cover(ID)
+                remaining -= sizes[i]
+                i = bisect_right(sizes, remaining, 0, i)   #skip straight past the subtrees that no longer fit
+            i -= 1
+        return chosenIDs
         
     def infectSubtree(self, newVersionNumber, rootID):
-        processingQueue = Queue()
-        processingQueue.put(rootID)
-        while not processingQueue.empty():
-            currentUserID = processingQueue.get()
-            self.users[currentUserID].setVersion(newVersionNumber)
-            for childID in self.spanningCoaches[currentUserID]:
-                processingQueue.put(childID)
+        '''
+        the virtual root is not a real user, so it is listed but never given a version
+        '''
+        stats = self.stats
+        start = perf_counter() if stats is not None else None
+        subtreeIDs = [rootID]
+        for currentUserID in subtreeIDs:    #grows as it is walked, like setSubtreeSizes
+            subtreeIDs.extend(self.spanningCoaches.get(currentUserID, ()))
+        
+        index = self.store.index
+        self.store.setVersions([index[ID] for ID in subtreeIDs if ID in index], newVersionNumber)
+        if stats is not None:
+            stats.record('infectSubtree', start, nodesVisited=len(subtreeIDs))
         
     
 class GraphViolation(Exception):
     
-    def __init__(self, message):
+    def __init__(self, message, violations=()):
         self.message = message
+        self.violations = list(violations)  #(row, message) pairs when raised by a bulk method
+        
+    @classmethod
+    def fromViolations(cls, kind, violations, shown=10):
+        rows = ', '.join('{} ({})'.format(row, message) for row, message in violations[:shown])
+        if len(violations) > shown:
+            rows += ' and {} more'.format(len(violations) - shown)
+        return cls('{} invalid {}, rows: {}'.format(len(violations), kind, rows), violations)
         
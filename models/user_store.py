@@ -0,0 +1,253 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+from array import array
+
+
+class UserStore(object):
+    '''
+    Columnar storage for the per-user state of a CoachingGraph
+    Each user added to the graph gets a slot, and every column is indexed by that slot,
+    so rollouts and size computations walk a few contiguous arrays instead of one object per user
+
+    self.ids is a list of slot:uuid
+    self.index is a dict of uuid:slot
+    self.names is a list of slot:name
+    self.versionCodes is an int array of slot:code, the version itself is self.versionTable[code]
+    self.subtreeSizes is an int array of slot:size of the spanning subtree rooted at that user
+
+    Version code 0 is reserved for users that have no version
+    
+    self.versionSlots is the reverse index, a list of code:{slots} of the users whose column holds that code.
+    It is built from the column the first time a population is asked for (see countVersion) and from then on
+    kept up to date by every write to the column, so stores that are never asked, such as a loaded snapshot,
+    never pay for it.
+    
+    A removed user's slot is tombstoned rather than reused, so every other slot stays put: its id and name become
+    None and its version code 0. self.removed counts the tombstones, compacted() returns a copy without them.
+    
+    self.listeners are called as listener(slots, version) after every version assignment,
+    once per bulk assignment rather than once per user
+    
+    self.layers is a stack of staged version overlays, each a sparse dict of slot:code. While a layer is staged
+    every assignment goes into the top layer and reads look through the layers, top first, before the columns.
+    commit() merges the top layer into the one below (or the columns) in one bulk pass per version, discard() drops
+    it in O(1). Listeners only hear about assignments that reach the columns, i.e. on the final commit.
+    '''
+
+
+    def __init__(self):
+        self.ids = []
+        self.index = {}
+        self.names = []
+        self.versionCodes = array('i')
+        self.subtreeSizes = array('q')
+        self.versionTable = [None]
+        self.versionLookup = {None: 0} #dict of version:code
+        self.listeners = []
+        self.layers = []
+        self.versionSlots = None
+        self.removed = 0
+
+    @classmethod
+    def fromColumns(cls, ids, index, names, versionCodes, subtreeSizes, versionTable):
+        '''
+        builds a store around existing columns, e.g. the memory-mapped ones of a snapshot
+        '''
+        store = cls()
+        store.ids, store.index, store.names = ids, index, names
+        store.versionCodes, store.subtreeSizes = versionCodes, subtreeSizes
+        store.versionTable = list(versionTable)
+        store.versionLookup = {version: code for code, version in enumerate(store.versionTable)}
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, UUID, name, version=None):
+        slot = len(self.ids)
+        self.ids.append(UUID)
+        self.index[UUID] = slot
+        self.names.append(name)
+        code = self.versionCode(version)
+        self.versionCodes.append(code)
+        self.subtreeSizes.append(0)
+        if self.versionSlots is not None:
+            self.versionSlots[code].add(slot)
+        return slot
+
+    def remove(self, slot):
+        '''
+        tombstones slot, see the class docstring
+        '''
+        del self.index[self.ids[slot]]
+        if self.versionSlots is not None:
+            self.versionSlots[self.versionCodes[slot]].discard(slot)
+        self.ids[slot] = None
+        self.names[slot] = None
+        self.versionCodes[slot] = 0
+        self.subtreeSizes[slot] = 0
+        for layer in self.layers:
+            layer.pop(slot, None)
+        self.removed += 1
+
+    def compacted(self):
+        '''
+        Returns (store, newSlots): a copy of the store without the tombstoned slots, the others renumbered in order,
+        and an int array of old slot:new slot, -1 for a tombstone. Versions keep their codes, and the listeners and
+        the staged layers move to the copy; this store is left as it was for whoever still holds it.
+        '''
+        store = UserStore()
+        store.versionTable, store.versionLookup = list(self.versionTable), dict(self.versionLookup)
+        newSlots = array('i', [-1]) * len(self.ids)
+        for slot, ID in enumerate(self.ids):
+            if ID is not None:
+                newSlots[slot] = len(store.ids)
+                store.index[ID] = len(store.ids)
+                store.ids.append(ID)
+                store.names.append(self.names[slot])
+                store.versionCodes.append(self.versionCodes[slot])
+                store.subtreeSizes.append(self.subtreeSizes[slot])
+        store.layers = [{newSlots[slot]: code for slot, code in layer.items()} for layer in self.layers]
+        store.listeners, self.listeners = self.listeners, []
+        return store, newSlots
+
+    def versionCode(self, version):
+        '''
+        returns the code for a version, allocating a new one the first time a version is seen
+        '''
+        code = self.versionLookup.get(version)
+        if code is None:
+            code = len(self.versionTable)
+            self.versionTable.append(version)
+            self.versionLookup[version] = code
+            if self.versionSlots is not None:
+                self.versionSlots.append(set())
+        return code
+
+    def getVersion(self, slot):
+        for layer in reversed(self.layers):
+            code = layer.get(slot)
+            if code is not None:
+                return self.versionTable[code]
+        return self.versionTable[self.versionCodes[slot]]
+
+    def setVersion(self, slot, version):
+        if self.layers:
+            self.layers[-1][slot] = self.versionCode(version)
+            return
+        code = self.versionCode(version)
+        if self.versionSlots is not None:
+            self.versionSlots[self.versionCodes[slot]].discard(slot)
+            self.versionSlots[code].add(slot)
+        self.versionCodes[slot] = code
+        for listener in self.listeners:
+            listener((slot,), version)
+
+    def setVersions(self, slots, version):
+        '''
+        bulk assignment of one version to many users, the version is only looked up once
+        '''
+        code = self.versionCode(version)
+        if self.layers:
+            self.layers[-1].update(dict.fromkeys(slots, code))
+            return
+        if self.listeners or self.versionSlots is not None:
+            slots = list(slots) #may be a generator, and the listeners or the index need it too
+        versionCodes = self.versionCodes
+        if self.versionSlots is not None:
+            versionSlots, newSlots = self.versionSlots, self.versionSlots[code]
+            for slot in slots:
+                oldCode = versionCodes[slot]
+                if oldCode != code:
+                    versionSlots[oldCode].discard(slot)
+                    newSlots.add(slot)
+        for slot in slots:
+            versionCodes[slot] = code
+        for listener in self.listeners:
+            listener(slots, version)
+
+    def getVersionSlots(self):
+        '''
+        self.versionSlots, built in one pass over the version column the first time
+        '''
+        if self.versionSlots is None:
+            versionSlots = [set() for _ in self.versionTable]
+            ids = self.ids
+            for slot, code in enumerate(self.versionCodes[:len(ids)]):
+                if ids[slot] is not None:   #not removed
+                    versionSlots[code].add(slot)
+            self.versionSlots = versionSlots
+        return self.versionSlots
+
+    def countVersion(self, version):
+        '''
+        the number of users on version, O(1) plus the size of the staged layers
+        '''
+        code = self.versionLookup.get(version)
+        committed = len(self.getVersionSlots()[code]) if code is not None else 0
+        if not self.layers:
+            return committed
+        joined, left = self._stagedChanges(code)
+        return committed + len(joined) - len(left)
+
+    def slotsWithVersion(self, version):
+        '''
+        the set of slots of the users on version, O(result) plus the size of the staged layers
+        '''
+        code = self.versionLookup.get(version)
+        slots = set(self.getVersionSlots()[code]) if code is not None else set()
+        if self.layers:
+            joined, left = self._stagedChanges(code)
+            slots |= joined
+            slots -= left
+        return slots
+
+    def versionCounts(self):
+        '''
+        dict of version:number of users on it, for every version at least one user is on
+        '''
+        return {version: count for version, count in ((version, self.countVersion(version)) for version in self.versionTable) if count}
+
+    def _stagedChanges(self, code):
+        '''
+        (joined, left): the slots the staged layers move onto code and off it, compared to the columns
+        '''
+        staged = {}
+        for layer in self.layers:
+            staged.update(layer)
+        versionCodes = self.versionCodes
+        joined = {slot for slot, stagedCode in staged.items() if stagedCode == code and versionCodes[slot] != code}
+        left = {slot for slot, stagedCode in staged.items() if stagedCode != code and versionCodes[slot] == code}
+        return joined, left
+
+    def stage(self):
+        self.layers.append({})
+
+    def discard(self):
+        self.layers.pop()
+
+    def commit(self):
+        layer = self.layers.pop()
+        slotsByCode = {}
+        for slot, code in layer.items():
+            slotsByCode.setdefault(code, []).append(slot)
+        for code, slots in slotsByCode.items():
+            self.setVersions(slots, self.versionTable[code])
+
+    def diff(self):
+        '''
+        the users whose version the top layer changes, as a dict of (oldVersion, newVersion):[userIDs]
+        '''
+        layer = self.layers.pop()   #so getVersion sees what is underneath
+        try:
+            changes = {}
+            for slot, code in layer.items():
+                oldVersion, newVersion = self.getVersion(slot), self.versionTable[code]
+                if oldVersion != newVersion:
+                    changes.setdefault((oldVersion, newVersion), []).append(self.ids[slot])
+            return changes
+        finally:
+            self.layers.append(layer)
@@ -0,0 +1,54 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from benchmark import generators
+from benchmark.run import compare, runCase
+
+
+class GeneratorsTest(unittest.TestCase):
+
+
+    def testSeeded(self):
+        for shape, generate in generators.SHAPES.items():
+            self.assertEqual(generate(500, seed=3), generate(500, seed=3), shape)
+            pairs = generate(500, seed=3)
+            self.assertTrue(all(0 <= coach < 500 and 0 <= coachee < 500 and coach != coachee for coach, coachee in pairs), shape)
+
+    def testShapes(self):
+        coachees = {coachee for coach, coachee in generators.rootlessCycles(1001)}
+        self.assertEqual(coachees, set(range(1001)))
+
+        graph, users = generators.buildGraph(1000, generators.chains(1000, length=100))
+        self.assertEqual(len(list(graph.components())), 10)
+
+        graph, users = generators.buildGraph(1000, generators.manyCoaches(1000, coachesPerUser=3))
+        self.assertEqual(len(graph.is_coached_by[users[500].UUID]), 3)
+
+        fanOut = sorted((len(coachees) for coachees in generators.buildGraph(2000, generators.powerLaw(2000))[0].coaches.values()), reverse=True)
+        self.assertGreater(fanOut[0], 10 * fanOut[len(fanOut) // 2])
+
+
+class RunTest(unittest.TestCase):
+
+
+    def testRunCase(self):
+        results = runCase('classrooms', 300, repeats=2, memory=True)
+        methods = [result['method'] for result in results]
+        self.assertEqual(len(methods), len(set(methods)))
+        self.assertIn('getSpanningTree', methods)
+        self.assertTrue(all(len(result['seconds']) == 2 for result in results))
+        self.assertTrue(all(result['peakMemory'] is not None for result in results if result['method'] not in ('getSpanningTree', 'setSubtreeSizes')))
+
+    def testCompare(self):
+        baseline = {'results': [{'shape': 'chains', 'size': 10, 'method': 'build', 'best': 1.0},
+                                {'shape': 'chains', 'size': 10, 'method': 'compile', 'best': 1.0}]}
+        current = {'results': [{'shape': 'chains', 'size': 10, 'method': 'build', 'best': 1.1},
+                               {'shape': 'chains', 'size': 10, 'method': 'compile', 'best': 1.5}]}
+        self.assertEqual(compare(baseline, current, tolerance=0.2), [('chains', 10, 'compile', 1.0, 1.5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from models.components import ComponentIndex, sourceComponentRoots
+
+
+class ComponentIndexTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.index = ComponentIndex()
+        for slot in range(6):
+            self.index.add(slot)
+
+    def testSingletons(self):
+        self.assertEqual(len(list(self.index.roots())), 6)
+        self.assertEqual(list(self.index.members(3)), [3])
+        self.assertEqual(self.index.size(3), 1)
+
+    def testUnion(self):
+        self.index.union(0, 1)
+        self.index.union(2, 3)
+        self.index.union(1, 3)
+        self.index.union(3, 0)   #already joined
+        self.assertEqual(self.index.size(2), 4)
+        self.assertEqual(sorted(self.index.members(2)), [0, 1, 2, 3])
+        self.assertEqual(list(self.index.members(2))[0], 2)
+        self.assertEqual(self.index.find(0), self.index.find(3))
+        self.assertNotEqual(self.index.find(0), self.index.find(4))
+        self.assertEqual(len(list(self.index.roots())), 3)
+
+    def testUnion_bySize(self):
+        self.index.union(0, 1)
+        self.index.union(0, 2)
+        root = self.index.find(0)
+        self.index.union(5, 0)
+        self.assertEqual(self.index.find(5), root)
+
+    def assertRings(self):
+        for slot in range(6):
+            self.assertEqual(self.index.prevMember[self.index.nextMember[slot]], slot)
+            self.assertEqual({self.index.find(member) for member in self.index.members(slot)}, {self.index.find(slot)})
+            self.assertEqual(len(list(self.index.members(slot))), self.index.size(slot))
+
+    def testSplit(self):
+        for slotA, slotB in [(0, 1), (1, 2), (2, 3), (4, 5)]:
+            self.index.union(slotA, slotB)
+        label, anchor = self.index.find(0), self.index.anchor[self.index.find(0)]
+        part = [anchor, 3 if anchor != 3 else 2]
+        self.index.split(part)  #the anchor moves to a slot that stays
+        rest = sorted({0, 1, 2, 3} - set(part))
+        self.assertEqual(sorted(self.index.members(rest[0])), rest)
+        self.assertEqual(self.index.find(rest[1]), label)
+        self.assertIn(self.index.anchor[label], rest)
+        self.assertEqual(self.index.size(part[1]), 2)
+        self.assertEqual(len(list(self.index.roots())), 3)
+        self.index.split([5, 4])    #already a component of its own
+        self.assertEqual(self.index.size(4), 2)
+        self.assertRings()
+
+        self.index.union(part[1], 4)
+        self.assertEqual(self.index.size(5), 4)
+        self.assertRings()
+
+    def testRenumbered(self):
+        self.index.union(0, 2)
+        self.index.union(2, 4)
+        renumbered = self.index.renumbered([0, -1, 1, -1, 2, 3])
+        self.assertEqual(sorted(renumbered.members(1)), [0, 1, 2])
+        self.assertEqual(renumbered.size(0), 3)
+        self.assertEqual(list(renumbered.members(3)), [3])
+        self.assertEqual(sorted(len(list(renumbered.members(root))) for root in renumbered.roots()), [1, 3])
+
+
+class SourceComponentRootsTest(unittest.TestCase):
+
+
+    def roots(self, nodes, edges):
+        successors = {}
+        for a, b in edges:
+            successors.setdefault(a, []).append(b)
+        return sourceComponentRoots(nodes, lambda node: successors.get(node, ()))
+
+    def testRoots(self):
+        #0 -> 1 -> 2 <-> 3, a rootless cycle 4 -> 5 -> 6 -> 4 feeding 7, a cycle 8 <-> 9 entered from 0, and 10 alone
+        edges = [(0, 1), (1, 2), (2, 3), (3, 2), (4, 5), (5, 6), (6, 4), (6, 7), (8, 9), (9, 8), (0, 9)]
+        self.assertEqual(self.roots(range(11), edges), [0, 4, 10])
+        self.assertEqual(self.roots([5, 9, 8, 6, 4, 0, 1, 2, 3, 7, 10], edges), [5, 0, 10])
+
+    def testEnteredLater(self):
+        #the cycle is searched first, and only found to have a coach from outside afterwards
+        self.assertEqual(self.roots([1, 2, 0], [(1, 2), (2, 1), (0, 1)]), [0])
+
+    def testLongChain(self):
+        #iterative, so a chain far deeper than the recursion limit is fine
+        self.assertEqual(self.roots(range(100000), [(i, i + 1) for i in range(99999)] + [(99999, 0)]), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from models.user_graph import CoachingGraph, GraphViolation, User
+
+
+class CompiledCoachingGraphTest(unittest.TestCase):
+
+
+    def setUp(self):
+        '''
+        graph with a loop and a branch off it, plus a disconnected rootless loop
+        '''
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(name, 1.0) for name in ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X']]
+        for user in self.testUsers:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (0, 3), (1, 4), (4, 5), (5, 6), (6, 4), (7, 8), (8, 9), (9, 7)]:
+            self.testGraph.addCoachingRelationship(self.testUsers[coach].UUID, self.testUsers[coachee].UUID)
+        self.compiled = self.testGraph.compile()
+
+    def versions(self):
+        return [user.siteVersion for user in self.testUsers]
+
+    def testCompile_csr(self):
+        self.assertEqual(len(self.compiled), 10)
+        coach = self.compiled.slotOf(self.testUsers[1].UUID)
+        coachees = self.compiled.coachees[self.compiled.coachOffsets[coach]:self.compiled.coachOffsets[coach + 1]]
+        self.assertEqual({self.compiled.ids[i] for i in coachees}, {self.testUsers[2].UUID, self.testUsers[4].UUID})
+        coachee = self.compiled.slotOf(self.testUsers[4].UUID)
+        coaches = self.compiled.coachedBy[self.compiled.coachedByOffsets[coachee]:self.compiled.coachedByOffsets[coachee + 1]]
+        self.assertEqual({self.compiled.ids[i] for i in coaches}, {self.testUsers[1].UUID, self.testUsers[6].UUID})
+
+    def testTotalInfection_upstream(self):
+        self.compiled.total_infection(self.testUsers[6].UUID, 1.1)
+        self.assertEqual(self.versions(), [1.1] * 7 + [1.0] * 3)
+
+    def testInfection_budget(self):
+        ids = [user.UUID for user in self.testUsers]
+        for graph in (self.testGraph, self.compiled):
+            reached = list(graph.iter_infection(ids[2]))
+            self.assertEqual(reached[:2], [ids[2], ids[1]])
+            self.assertEqual(set(reached[2:4]), {ids[0], ids[4]})
+            self.assertEqual(set(reached[4:]), {ids[3], ids[5], ids[6]})
+            self.assertEqual(len(list(graph.iter_infection(ids[2], max_hops=2))), 4)
+            self.assertEqual(list(graph.iter_infection(ids[2], max_users=2)), [ids[2], ids[1]])
+
+        self.assertEqual(self.compiled.total_infection(ids[2], 1.1, max_users=3), (3, False))
+        self.assertEqual(self.versions().count(1.1), 3)
+        self.assertEqual(self.compiled.total_infection(ids[2], 1.2, max_hops=3), (7, True))
+        self.assertEqual(self.testGraph.total_infection(ids[7], 1.3, max_users=3), (3, True))
+        self.assertEqual(self.testGraph.total_infection(ids[2], 1.4, max_hops=2), (4, False))
+        self.assertEqual(self.versions(), [1.4, 1.4, 1.4, 1.2, 1.4, 1.2, 1.2, 1.3, 1.3, 1.3])
+        self.assertEqual(self.testGraph.total_infection(ids[0], 1.5), (7, True))
+
+        unknownID = User('XI').UUID
+        for budget in ({}, {'max_users': 3}):
+            with self.assertRaises(GraphViolation):
+                self.testGraph.total_infection(unknownID, 1.6, **budget)
+            with self.assertRaises(GraphViolation):
+                self.testGraph.plan_total_infection(unknownID, **budget)
+
+    def testSelectSubtree_everyone(self):
+        '''
+        two 3 user trees: a target nearer 6 than 3 selects every user, through the virtual root, in both forms
+        '''
+        graph = CoachingGraph()
+        users = [User(str(i), 1.0) for i in range(6)]
+        graph.addUsers(users)
+        graph.addCoachingRelationships([(users[coach].UUID, users[coachee].UUID) for coach, coachee in [(0, 1), (0, 2), (3, 4), (4, 5)]])
+        for target, infected in [(4, 3), (5, 6), (100, 6)]:
+            self.assertEqual(len(graph.plan_limited_infection(target)), infected)
+            compiled = graph.compile()
+            compiled.limited_infection(target, target)
+            self.assertEqual(sum(user.siteVersion == target for user in users), infected)
+        compiled = graph.compile()
+        compiled.preprocess()
+        self.assertEqual(compiled.selectSubtree(100), compiled.virtualRootID)
+
+    def testSizeIndex(self):
+        '''
+        built with the subtree sizes, removed users left out, and answering like the scan over every subtree it replaces
+        '''
+        self.testGraph.removeUser(self.testUsers[3].UUID)
+        compiled = self.testGraph.compile()
+        compiled.preprocess()
+        subtreeSizes = compiled.subtreeSizes
+        self.assertEqual(sorted(compiled.sizeOrder), [slot for slot in range(10) if compiled.ids[slot] is not None])
+        self.assertEqual(list(compiled.sizeKeys), sorted(subtreeSizes[slot] for slot in compiled.sizeOrder) + [9])
+        for target in range(12):
+            nearest = min(list(compiled.sizeKeys) + [0], key=lambda size: (abs(size - target), size))
+            rootID = compiled.selectSubtree(target)
+            if nearest == 0:
+                self.assertIsNone(rootID)
+            elif rootID == compiled.virtualRootID:
+                self.assertEqual(nearest, 9)
+            else:
+                self.assertEqual(subtreeSizes[compiled.slotOf(rootID)], nearest)
+
+    def testSpanningTree(self):
+        self.compiled.getSpanningTree()
+        self.compiled.setSubtreeSizes()
+        sizes = [self.compiled.subtreeSizes[self.compiled.slotOf(user.UUID)] for user in self.testUsers]
+        self.assertEqual(sizes[:7], [7, 5, 1, 1, 3, 2, 1])
+        self.assertEqual(sorted(sizes[7:]), [1, 2, 3])
+        roots = [i for i, p in enumerate(self.compiled.spanningParent) if p == -1]
+        self.assertEqual(len(roots), 2)
+
+    def testLimitedInfection(self):
+        self.compiled.limited_infection(1.1, 5)
+        self.assertEqual(self.versions(), [1.0, 1.1, 1.1, 1.0, 1.1, 1.1, 1.1, 1.0, 1.0, 1.0])
+
+    def testCompile_doesNotTouchSource(self):
+        self.assertEqual(len(self.testGraph.coaches), 8)
+        self.assertEqual(len(self.testGraph.is_coached_by), 9)
+
+    def testSpanningTree_sameAsGraph(self):
+        self.compiled.getSpanningTree()
+        self.testGraph.updateSpanningTree()
+        for user in self.testUsers:
+            parent = self.compiled.spanningParent[self.compiled.slotOf(user.UUID)]
+            parentID = self.testGraph.virtualRootUser.UUID if parent == -1 else self.compiled.ids[parent]
+            self.assertEqual(parentID, self.testGraph.spanningIs_coached_by[user.UUID])
+
+    def testComponents_removedUser(self):
+        graph = CoachingGraph()
+        users = [User(str(i), 1.0) for i in range(3)]
+        graph.addUsers(users)
+        graph.addCoachingRelationship(users[0].UUID, users[1].UUID)
+        graph.removeUser(users[2].UUID)
+        self.assertEqual([sorted(members) for members in graph.compile().components()], [[0, 1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from models.user_graph import CoachingGraph, GraphViolation, User
+
+
+class FrozenCoachingGraphTest(unittest.TestCase):
+
+
+    def setUp(self):
+        '''
+        graph with a loop and a branch off it, plus a disconnected rootless loop
+        '''
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(name, 1.0) for name in ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X']]
+        self.testGraph.addUsers(self.testUsers)
+        self.testGraph.addCoachingRelationships([(self.testUsers[coach].UUID, self.testUsers[coachee].UUID) for coach, coachee in
+                                                 [(0, 1), (1, 2), (0, 3), (1, 4), (4, 5), (5, 6), (6, 4), (7, 8), (8, 9), (9, 7)]])
+        self.frozen = self.testGraph.freeze()
+        self.ids = [user.UUID for user in self.testUsers]
+
+    def testReads(self):
+        self.assertEqual(len(self.frozen), 10)
+        self.assertEqual(self.frozen.ids[:], self.ids)
+        self.assertEqual(self.frozen.slotOf(self.ids[4]), 4)
+        self.assertEqual(self.frozen.componentSize(self.ids[2]), 7)
+        self.assertEqual(sorted(len(members) for members in self.frozen.components()), [3, 7])
+        self.assertEqual(self.frozen.plan_total_infection(self.ids[8]), frozenset(self.ids[7:]))
+        self.assertEqual(self.frozen.plan_total_infection(self.ids[2], max_hops=1), frozenset(self.ids[1:3]))
+        for target in (5, 7, 9, 100):  #the largest tree has 7 users, everyone is 10
+            self.assertEqual(self.frozen.plan_limited_infection(target), self.testGraph.plan_limited_infection(target))
+        self.assertEqual(self.frozen.plan_limited_infection(100), frozenset(self.ids))
+        self.assertEqual([self.frozen.subtreeSizes[slot] for slot in range(7)], [7, 5, 1, 1, 3, 2, 1])
+        self.assertEqual(list(self.frozen.sizeKeys), [1, 1, 1, 1, 2, 2, 3, 3, 5, 7, 10])
+        self.assertEqual(self.frozen.countVersion(1.0), 10)
+
+    def testImmutable(self):
+        with self.assertRaises(GraphViolation):
+            self.frozen.total_infection(self.ids[0], 1.1)
+        with self.assertRaises(GraphViolation):
+            self.frozen.limited_infection(1.1, 3)
+        with self.assertRaises(GraphViolation):
+            self.frozen.getSpanningTree()
+        with self.assertRaises(GraphViolation):
+            self.frozen.size = 3
+        with self.assertRaises(TypeError):
+            self.frozen.coachees[0] = 1
+        with self.assertRaises(TypeError):
+            self.frozen.sizeOrder[0] = 1
+        with self.assertRaises(GraphViolation):
+            self.frozen.store.setVersions([0], 1.1)
+        self.assertEqual([user.siteVersion for user in self.testUsers], [1.0] * 10)
+
+    def testIndependentOfSource(self):
+        self.testGraph.total_infection(self.ids[7], 1.1)
+        self.testGraph.removeUser(self.ids[0])
+        self.assertEqual(self.frozen.countVersion(1.1), 0)
+        self.assertEqual(self.frozen.componentSize(self.ids[2]), 7)
+
+        refrozen = self.testGraph.freeze()
+        self.assertEqual(refrozen.countVersion(1.1), 3)
+        self.assertIsNone(refrozen.ids[0])
+        with self.assertRaises(KeyError):
+            refrozen.slotOf(self.ids[0])
+        self.assertEqual(sorted(len(members) for members in refrozen.components()), [1, 3, 5])
+
+    def testStaged(self):
+        self.testGraph.stage()
+        with self.assertRaises(GraphViolation):
+            self.testGraph.freeze()
+
+    def testNoPhantomEntries(self):
+        self.testGraph.total_infection(self.ids[0], 1.1, max_hops=5)
+        self.testGraph.limited_infection(1.2, 3)
+        self.testGraph.plan_total_infection(self.ids[3])
+        self.assertEqual(len(self.testGraph.coaches), 8)
+        self.assertEqual(len(self.testGraph.is_coached_by), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
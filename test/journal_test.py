@@ -0,0 +1,133 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from models.journal import RolloutJournal
+from models.user_graph import CoachingGraph, User
+
+
+class RolloutJournalTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rollout.journal')
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(name, 1.0) for name in ['I', 'II', 'III', 'IV', 'V']]
+        self.testGraph.addUsers(self.testUsers[:3])
+        self.testGraph.addCoachingRelationship(self.testUsers[0].UUID, self.testUsers[1].UUID)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def rollout(self, journal):
+        journal.attach(self.testGraph)
+        self.testGraph.addUsers(self.testUsers[3:])
+        self.testGraph.addCoachingRelationships([(self.testUsers[2].UUID, self.testUsers[3].UUID)])
+        self.testGraph.total_infection(self.testUsers[1].UUID, 1.1)
+        self.testGraph.total_infection(self.testUsers[3].UUID, 1.2)
+        self.testUsers[4].setVersion(1.3)
+        self.testGraph.total_infection(self.testUsers[0].UUID, 1.4)
+
+    def restored(self, journal):
+        '''
+        the graph as it was before the rollout, rebuilt with the same users
+        '''
+        graph = CoachingGraph()
+        users = []
+        for user in self.testUsers[:3]:
+            copy = User(user.name, 1.0)
+            copy.UUID = user.UUID
+            users.append(copy)
+        graph.addUsers(users)
+        graph.addCoachingRelationship(users[0].UUID, users[1].UUID)
+        journal.replay(graph)
+        return graph
+
+    def versions(self, graph):
+        return [graph.users[user.UUID].siteVersion for user in self.testUsers]
+
+    def testRecordsAreBatched(self):
+        journal = RolloutJournal(self.path)
+        self.rollout(journal)
+        kinds = [record[0] for record in journal.records()]
+        self.assertEqual(kinds, ['users', 'relationships', 'version', 'version', 'version', 'version'])
+        self.assertEqual(len(list(journal.records())[2][2]), 2)
+
+    def testReplay(self):
+        journal = RolloutJournal(self.path, fsync=True)
+        self.rollout(journal)
+        journal.close()
+
+        reopened = RolloutJournal(self.path)
+        graph = self.restored(reopened)
+        self.assertEqual(self.versions(graph), [1.4, 1.4, 1.2, 1.2, 1.3])
+        self.assertEqual(graph.componentSize(self.testUsers[2].UUID), 2)
+
+    def testTornRecord(self):
+        journal = RolloutJournal(self.path)
+        self.rollout(journal)
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00garbage')
+
+        reopened = RolloutJournal(self.path)
+        self.assertEqual(len(list(reopened.records())), 6)
+        reopened.recordVersion(1.5, [self.testUsers[4].UUID])
+        self.assertEqual(self.versions(self.restored(reopened)), [1.4, 1.4, 1.2, 1.2, 1.5])
+
+    def testCompact(self):
+        journal = RolloutJournal(self.path)
+        self.rollout(journal)
+        size = os.path.getsize(self.path)
+        journal.compact()
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertEqual([record[0] for record in journal.records()], ['users', 'relationships', 'version', 'version'])
+        self.assertEqual(self.versions(self.restored(journal)), [1.4, 1.4, 1.2, 1.2, 1.3])
+
+        #still attached after compacting
+        self.testGraph.total_infection(self.testUsers[4].UUID, 2.0)
+        self.assertEqual(self.versions(self.restored(journal))[4], 2.0)
+
+    def testRemovals(self):
+        journal = RolloutJournal(self.path)
+        self.rollout(journal)
+        self.testGraph.removeCoachingRelationship(self.testUsers[0].UUID, self.testUsers[1].UUID)
+        self.testGraph.removeUser(self.testUsers[3].UUID)
+        self.testGraph.removeUser(self.testUsers[2].UUID)
+        kinds = [record[0] for record in journal.records()]
+        self.assertEqual(kinds[-3:], ['removedRelationships', 'removedUsers', 'removedUsers'])
+
+        graph = self.restored(journal)
+        self.assertEqual(set(graph.users), {self.testUsers[i].UUID for i in (0, 1, 4)})
+        self.assertEqual(dict(graph.coaches), {})
+
+        journal.compact()
+        self.assertEqual([record[0] for record in journal.records()], ['removedRelationships', 'removedUsers', 'users', 'version'])
+        graph = self.restored(journal)
+        self.assertEqual(set(graph.users), {self.testUsers[i].UUID for i in (0, 1, 4)})
+        self.assertEqual(dict(graph.coaches), {})
+        self.assertEqual([graph.users[self.testUsers[i].UUID].siteVersion for i in (0, 1, 4)], [1.4, 1.4, 1.3])
+
+    def testGraphCompacted(self):
+        journal = RolloutJournal(self.path)
+        journal.attach(self.testGraph)
+        self.testGraph.removeUser(self.testUsers[0].UUID)
+        self.testGraph.compact()
+        self.testGraph.total_infection(self.testUsers[2].UUID, 1.5)
+        self.assertEqual(list(journal.records())[-1], ('version', 1.5, [self.testUsers[2].UUID]))
+
+    def testCompactAt(self):
+        journal = RolloutJournal(self.path, compactAt=1)
+        self.rollout(journal)
+        self.assertEqual(len(list(journal.records())), 4)
+        self.assertEqual(self.versions(self.restored(journal)), [1.4, 1.4, 1.2, 1.2, 1.3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from models.loaders import loadRelationships, loadUsers, readChunks
+from models.user_graph import CoachingGraph, GraphViolation
+
+
+class LoadersTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.testGraph = CoachingGraph()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text, compress=False):
+        path = os.path.join(self.directory, name)
+        with (gzip.open if compress else open)(path, 'wt') as f:
+            f.write(text)
+        return path
+
+    def testReadChunks(self):
+        path = self.write('rows.csv', 'id,name\n' + ''.join('{},user {}\n'.format(i, i) for i in range(7)))
+        progress = []
+        chunks = list(readChunks(path, chunkSize=3, progress=lambda rows, size: progress.append((rows, size))))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(chunks[1][0], ['3', 'user 3'])
+        self.assertEqual([rows for rows, size in progress], [3, 6, 7])
+        self.assertEqual(progress[-1][1], os.path.getsize(path))
+
+    def testLoad(self):
+        roster = self.write('users.tsv.gz', 'id\tname\tversion\na\tAnn\t1.0\nb\tBen\t1.0\nc\t"Cal\tC."\t\n', compress=True)
+        edges = self.write('edges.csv', 'coach,coachee\na,b\na,c\na,b\n')
+        idMap = loadUsers(self.testGraph, roster, versionColumn=2, parseVersion=float, chunkSize=2)
+        loadRelationships(self.testGraph, edges, idMap, chunkSize=2)
+
+        self.assertEqual(len(self.testGraph.users), 3)
+        self.assertEqual(self.testGraph.users[idMap['c']].name, 'Cal\tC.')
+        self.assertIsNone(self.testGraph.users[idMap['c']].siteVersion)
+        self.assertEqual(self.testGraph.users[idMap['a']].siteVersion, 1.0)
+        self.assertEqual(self.testGraph.coaches[idMap['a']], {idMap['b'], idMap['c']})
+        self.assertEqual(self.testGraph.is_coached_by[idMap['b']], {idMap['a']})
+
+    def testLoad_unknownID(self):
+        roster = self.write('users.csv', 'id,name\na,Ann\nb,Ben\n')
+        edges = self.write('edges.csv', 'coach,coachee\na,b\nb,b\na,x\n')
+        idMap = loadUsers(self.testGraph, roster)
+        with self.assertRaises(GraphViolation) as raised:
+            loadRelationships(self.testGraph, edges, idMap, chunkSize=2)
+        self.assertEqual([row for row, message in raised.exception.violations], [1])
+        with self.assertRaises(GraphViolation) as raised:
+            loadRelationships(self.testGraph, edges, idMap, chunkSize=1)
+        self.assertEqual([row for row, message in raised.exception.violations], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
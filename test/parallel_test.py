@@ -0,0 +1,80 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import os
+import random
+import tempfile
+import unittest
+from models.user_graph import CoachingGraph, User
+from models import parallel
+
+
+class ParallelSpanningTreeTest(unittest.TestCase):
+
+
+    def setUp(self):
+        '''
+        many small classrooms, some of them rootless loops, and a few coaches shared between classrooms
+        '''
+        generator = random.Random(15)
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(str(i), 1.0) for i in range(600)]
+        self.testGraph.addUsers(self.testUsers)
+        relationships = []
+        for start in range(0, 600, 20):
+            classroom = self.testUsers[start:start + 20]
+            if start % 60 == 0:
+                relationships += [(classroom[i].UUID, classroom[(i + 1) % 20].UUID) for i in range(20)]
+            else:
+                relationships += [(classroom[0].UUID, student.UUID) for student in classroom[1:]]
+            relationships.append((classroom[generator.randrange(20)].UUID, classroom[generator.randrange(1, 20)].UUID))
+        relationships += [(self.testUsers[generator.randrange(600)].UUID, self.testUsers[generator.randrange(600)].UUID) for _ in range(5)]
+        self.testGraph.addCoachingRelationships(list(dict.fromkeys(relationships)))
+
+    def assertSameTree(self, compiled):
+        compiled.preprocess()
+        serialParent, serialSizes = list(compiled.spanningParent), list(compiled.subtreeSizes)
+        compiled.spanningParent = compiled.subtreeSizes = None
+        compiled.preprocess(processes=2)
+        self.assertEqual(list(compiled.spanningParent), serialParent)
+        self.assertEqual(list(compiled.subtreeSizes), serialSizes)
+        position = {slot: i for i, slot in enumerate(compiled.spanningOrder)}
+        self.assertEqual(len(position), len(compiled.spanningOrder))
+        for slot in compiled.spanningOrder:
+            if compiled.spanningParent[slot] >= 0:
+                self.assertLess(position[compiled.spanningParent[slot]], position[slot])
+
+    def testParallel_matchesSerial(self):
+        self.assertSameTree(self.testGraph.compile())
+
+    def testParallel_snapshot(self):
+        #a loaded snapshot has no component index, so the groups come from the CSR arrays
+        path = os.path.join(tempfile.mkdtemp(), 'graph.snapshot')
+        self.testGraph.save(path, includeSpanningTree=False)
+        loaded = CoachingGraph.load(path)
+        self.assertIsNone(loaded.componentIndex)
+        self.assertSameTree(loaded)
+
+    def testParallel_removedUsers(self):
+        for user in self.testUsers[::7]:
+            self.testGraph.removeUser(user.UUID)
+        self.assertSameTree(self.testGraph.compile())
+
+    def testComponentGroups(self):
+        groupOffsets, groupSlots = parallel._componentGroups(self.testGraph.compile(), 4)
+        self.assertEqual(len(groupOffsets), 5)
+        self.assertEqual(sorted(groupSlots), list(range(600)))
+        for group in range(4):
+            slots = list(groupSlots[groupOffsets[group]:groupOffsets[group + 1]])
+            self.assertEqual(slots, sorted(slots))
+
+    def testLimitedInfection_processes(self):
+        compiled = self.testGraph.compile()
+        compiled.limited_infection(1.1, 19, processes=2)
+        self.assertEqual(sum(user.siteVersion == 1.1 for user in self.testUsers), 19)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from collections import Counter
+from models import partition
+from models.user_graph import CoachingGraph, User
+
+
+class PartitionTest(unittest.TestCase):
+
+
+    def buildGraph(self, size, relationships):
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(str(i), 1.0) for i in range(size)]
+        self.testGraph.addUsers(self.testUsers)
+        self.testGraph.addCoachingRelationships([(self.testUsers[coach].UUID, self.testUsers[coachee].UUID)
+                                                 for coach, coachee in relationships])
+        return self.testGraph.compile()
+
+    def cliques(self):
+        '''
+        two groups of six who all coach each other, joined by a single relationship
+        '''
+        relationships = [(a, b) for group in (range(6), range(6, 12)) for a in group for b in group if a < b]
+        return self.buildGraph(12, relationships + [(0, 6)])
+
+    def testWholeComponents(self):
+        #classrooms of 10, 5 and 3
+        compiled = self.buildGraph(18, [(0, i) for i in range(1, 10)] + [(10, i) for i in range(11, 15)] + [(15, 16), (15, 17)])
+        slots, cut = partition.selectPartition(compiled, 8, tolerance=0)
+        self.assertEqual(sorted(slots), list(range(10, 18)))
+        self.assertEqual(cut, 0)
+
+    def testCliques(self):
+        compiled = self.cliques()
+        slots, cut = partition.selectPartition(compiled, 6, tolerance=0)
+        self.assertIn(sorted(slots), [list(range(6)), list(range(6, 12))])
+        self.assertEqual(cut, 1)
+
+    def testTolerance(self):
+        #a chain of 20 with a fan of 5 hanging off its middle
+        compiled = self.buildGraph(25, [(i, i + 1) for i in range(19)] + [(10, i) for i in range(20, 25)])
+        slots, cut = partition.selectPartition(compiled, 12, tolerance=0)
+        self.assertEqual(len(slots), 12)
+        slots, cut = partition.selectPartition(compiled, 12, tolerance=0.5)
+        self.assertTrue(6 <= len(slots) <= 18)
+        self.assertEqual(cut, 1)
+
+    def testLabelPropagation_capped(self):
+        compiled = self.cliques()
+        label = partition.labelPropagation(compiled, list(range(12)), 4)
+        self.assertLessEqual(max(Counter(label.values()).values()), 4)
+
+    def testGraph_partitioned(self):
+        self.cliques()
+        userIDs, cut = self.testGraph.selectPartition(6, tolerance=0)
+        self.assertEqual(len(userIDs), 6)
+        self.assertEqual(self.testGraph.limited_infection_partitioned(1.1, 6, tolerance=0), (6, 1))
+        versions = [user.siteVersion for user in self.testUsers]
+        self.assertIn(versions, [[1.1] * 6 + [1.0] * 6, [1.0] * 6 + [1.1] * 6])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import asyncio
+import unittest
+from models.rollout import InMemorySink, RolloutPipeline
+from models.user_graph import CoachingGraph, GraphViolation, User
+
+
+class RolloutPipelineTest(unittest.TestCase):
+
+
+    def setUp(self):
+        '''
+        one coach with 99 students and a separate pair
+        '''
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(str(i), 1.0) for i in range(102)]
+        self.testGraph.addUsers(self.testUsers)
+        self.testGraph.addCoachingRelationships([(self.testUsers[0].UUID, student.UUID) for student in self.testUsers[1:100]] +
+                                                [(self.testUsers[100].UUID, self.testUsers[101].UUID)])
+
+    def testTotalInfection_published(self):
+        sink = InMemorySink(delay=0.001)
+        pipeline = RolloutPipeline(self.testGraph, sink, batchSize=10, concurrency=3)
+        infected = asyncio.run(pipeline.total_infection(self.testUsers[5].UUID, 1.1))
+        self.assertEqual(infected, 100)
+        self.assertEqual(sink.versions, {user.UUID: 1.1 for user in self.testUsers[:100]})
+        self.assertEqual([len(userIDs) for version, userIDs in sink.batches], [10] * 10)
+        self.assertEqual(sink.peakActive, 3)
+        self.assertEqual([user.siteVersion for user in self.testUsers], [1.1] * 100 + [1.0] * 2)
+
+    def testTotalInfection_unknownUser(self):
+        sink = InMemorySink()
+        with self.assertRaises(GraphViolation):
+            asyncio.run(RolloutPipeline(self.testGraph, sink).total_infection('unknown', 1.1))
+        self.assertEqual(sink.calls, 0)
+
+    def testLimitedInfection_published(self):
+        sink = InMemorySink()
+        pipeline = RolloutPipeline(self.testGraph, sink, batchSize=4)
+        infected = asyncio.run(pipeline.limited_infection(1.1, 2))
+        self.assertEqual(infected, 2)
+        self.assertEqual(set(sink.versions), {self.testUsers[100].UUID, self.testUsers[101].UUID})
+
+    def testBackPressure(self):
+        #with one publisher and one pending batch, the traversal can never be more than two batches ahead
+        sink = InMemorySink(delay=0.001)
+        pipeline = RolloutPipeline(self.testGraph, sink, batchSize=10, concurrency=1, maxPendingBatches=1)
+        lead = []
+        def slots():
+            for slot in range(100):
+                lead.append(slot // 10 - len(sink.batches))
+                yield slot
+        asyncio.run(pipeline.rollout(slots(), 1.1))
+        self.assertLessEqual(max(lead), 2)
+        self.assertEqual(len(sink.batches), 10)
+
+    def testSinkFailure(self):
+        sink = InMemorySink(failAt=2)
+        pipeline = RolloutPipeline(self.testGraph, sink, batchSize=10, concurrency=2, maxPendingBatches=1)
+        with self.assertRaises(IOError):
+            asyncio.run(pipeline.total_infection(self.testUsers[0].UUID, 1.1))
+        self.assertLess(len(sink.batches), 10)
+
+    def testSinkFailure_staged(self):
+        self.testGraph.stage()
+        pipeline = RolloutPipeline(self.testGraph, InMemorySink(failAt=0), batchSize=10)
+        with self.assertRaises(IOError):
+            asyncio.run(pipeline.total_infection(self.testUsers[0].UUID, 1.1))
+        self.testGraph.discardStage()
+        self.assertEqual({user.siteVersion for user in self.testUsers}, {1.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from uuid import uuid4
+from models.user_graph import CoachingGraph, User
+
+
+class SnapshotTest(unittest.TestCase):
+
+
+    def setUp(self):
+        '''
+        graph with a loop and a branch off it, plus a disconnected rootless loop
+        '''
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'graph.snapshot')
+        self.testGraph = CoachingGraph()
+        self.testUsers = [User(name, 1.0) for name in ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X']]
+        self.testUsers[9].setVersion('beta')
+        for user in self.testUsers:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (0, 3), (1, 4), (4, 5), (5, 6), (6, 4), (7, 8), (8, 9), (9, 7)]:
+            self.testGraph.addCoachingRelationship(self.testUsers[coach].UUID, self.testUsers[coachee].UUID)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def versions(self, loaded):
+        return [loaded.store.getVersion(loaded.slotOf(user.UUID)) for user in self.testUsers]
+
+    def testRoundTrip(self):
+        self.testGraph.save(self.path)
+        for mmap in [True, False]:
+            loaded = CoachingGraph.load(self.path, mmap=mmap)
+            self.assertEqual(len(loaded), 10)
+            self.assertEqual(list(loaded.ids), [user.UUID for user in self.testUsers])
+            self.assertEqual([loaded.store.names[loaded.slotOf(user.UUID)] for user in self.testUsers], [user.name for user in self.testUsers])
+            self.assertEqual(self.versions(loaded), [1.0] * 9 + ['beta'])
+            with self.assertRaises(KeyError):
+                loaded.slotOf(uuid4())
+
+            loaded.total_infection(self.testUsers[6].UUID, 1.1)
+            self.assertEqual(self.versions(loaded), [1.1] * 7 + [1.0] * 2 + ['beta'])
+            self.assertEqual(self.testUsers[0].siteVersion, 1.0)   #the source graph is untouched
+
+    def testRoundTrip_spanningTree(self):
+        self.testGraph.save(self.path)
+        loaded = CoachingGraph.load(self.path)
+        sizes = [loaded.subtreeSizes[loaded.slotOf(user.UUID)] for user in self.testUsers]
+        self.assertEqual(sizes[:7], [7, 5, 1, 1, 3, 2, 1])
+        loaded.limited_infection(1.2, 3)
+        self.assertEqual(self.versions(loaded)[4:7], [1.2] * 3)
+
+        #the file itself is never written
+        reloaded = CoachingGraph.load(self.path)
+        self.assertEqual(self.versions(reloaded), [1.0] * 9 + ['beta'])
+
+    def testWithoutSpanningTree(self):
+        self.testGraph.save(self.path, includeSpanningTree=False)
+        loaded = CoachingGraph.load(self.path)
+        self.assertIsNone(loaded.spanningParent)
+        loaded.limited_infection(1.2, 5)
+        self.assertEqual(self.versions(loaded)[:7], [1.0, 1.2, 1.2, 1.0, 1.2, 1.2, 1.2])
+
+    def testNotASnapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\x00' * 64)
+        with self.assertRaises(ValueError):
+            CoachingGraph.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from models.subset_sum import closestSubsetSum
+
+
+class SubsetSumTest(unittest.TestCase):
+
+
+    def testExact(self):
+        sizes = [7, 3, 5, 3, 11]
+        chosen, total = closestSubsetSum(sizes, 14)
+        self.assertEqual(total, 14)
+        self.assertEqual(sum(sizes[i] for i in chosen), 14)
+        self.assertEqual(len(set(chosen)), len(chosen))
+
+    def testClosestBelow(self):
+        chosen, total = closestSubsetSum([4, 6, 10], 9)
+        self.assertEqual(total, 6)
+        self.assertEqual(chosen, [1])
+        self.assertEqual(closestSubsetSum([4, 6], 3), ([], 0))
+
+    def testManyEqualSizes(self):
+        sizes = [2] * 100000 + [5] * 3
+        chosen, total = closestSubsetSum(sizes, 12345)
+        self.assertEqual(total, 12345)
+        self.assertEqual(sum(sizes[i] for i in chosen), 12345)
+        self.assertEqual(len(set(chosen)), len(chosen))
+
+    def testMemoryBudget(self):
+        self.assertIsNone(closestSubsetSum(list(range(1, 1000)), 10**6, memoryBudget=1024))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ Created on Sep 13, 2016
 
 @author: Max
 '''
+import random
 import unittest
 from models.user_graph import CoachingGraph, GraphViolation, User
 from _collections import defaultdict
@@ -76,6 +77,41 @@ class UserGraphTest(unittest.TestCase):
         self.testGraph.addCoachingRelationship(self.testUser5.UUID, self.testUser6.UUID)
         self.assertEqual(len(self.testGraph.coaches.keys()), 3) #there should be 3 coaches in this graph
         
+    def testGraph_addUsers(self):
+        self.testGraph.addUsers([self.testUser1, self.testUser2])
+        self.assertEqual(len(self.testGraph.users), 2)
+        
+        self.testUser3 = User('test user III')
+        with self.assertRaises(GraphViolation) as raised:
+            self.testGraph.addUsers([self.testUser3, self.testUser1, self.testUser3])
+        self.assertEqual([row for row, message in raised.exception.violations], [1, 2])
+        self.assertEqual(len(self.testGraph.users), 2) #nothing added
+        
+    def testGraph_addRelationships(self):
+        self.testUser3 = User('test user III')
+        self.testUser4 = User('test user IV')
+        self.testGraph.addUsers([self.testUser1, self.testUser2, self.testUser3])
+        
+        with self.assertRaises(GraphViolation) as raised:
+            self.testGraph.addCoachingRelationships([
+                (self.testUser1.UUID, self.testUser2.UUID),
+                (self.testUser1.UUID, self.testUser4.UUID),
+                (self.testUser3.UUID, self.testUser3.UUID),
+                ])
+        self.assertEqual([row for row, message in raised.exception.violations], [1, 2])
+        self.assertIn('2 invalid relationships', raised.exception.message)
+        self.assertEqual(len(self.testGraph.coaches), 0)
+        
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        self.testGraph.addCoachingRelationships([
+            (self.testUser1.UUID, self.testUser2.UUID),
+            (self.testUser2.UUID, self.testUser3.UUID),
+            (self.testUser2.UUID, self.testUser3.UUID),
+            ])
+        self.assertEqual(self.testGraph.is_coached_by[self.testUser2.UUID], {self.testUser1.UUID})
+        self.assertEqual(self.testGraph.is_coached_by[self.testUser3.UUID], {self.testUser2.UUID})
+        self.assertEqual(self.testGraph.componentSize(self.testUser1.UUID), 3)
+        
     def testInfect_disconnected(self):
         '''
         disconnected graph with a branch
@@ -235,6 +271,67 @@ class UserGraphTest(unittest.TestCase):
         self.assertEqual(self.testUser6.siteVersion, 1.0)
         self.assertEqual(self.testUser7.siteVersion, 1.1)
         
+    def testInfect_bulk(self):
+        '''
+        the frontier search only reads the adjacency dicts
+        '''
+        self.testUser3 = User('test user III', 1.0)
+        self.testGraph.addUser(self.testUser1)
+        self.testGraph.addUser(self.testUser2)
+        self.testGraph.addUser(self.testUser3)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        
+        self.testGraph.total_infection(self.testUser2.UUID, 1.1)
+        self.assertEqual(self.testUser1.siteVersion, 1.1)
+        self.assertEqual(self.testUser2.siteVersion, 1.1)
+        self.assertEqual(self.testUser3.siteVersion, 1.0)
+        self.assertEqual(set(self.testGraph.coaches.keys()), {self.testUser1.UUID})
+        self.assertEqual(set(self.testGraph.is_coached_by.keys()), {self.testUser2.UUID})
+        
+    def testComponents(self):
+        '''
+        disconnected graph with a loop
+        '''
+        self.testUser3 = User('test user III')
+        self.testUser4 = User('test user IV')
+        self.testUser5 = User('test user V')
+        for user in [self.testUser1, self.testUser2, self.testUser3, self.testUser4, self.testUser5]:
+            self.testGraph.addUser(user)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        self.testGraph.addCoachingRelationship(self.testUser3.UUID, self.testUser4.UUID)
+        self.testGraph.addCoachingRelationship(self.testUser4.UUID, self.testUser3.UUID)
+        self.testGraph.addCoachingRelationship(self.testUser2.UUID, self.testUser4.UUID)
+        
+        self.assertEqual(self.testGraph.componentSize(self.testUser1.UUID), 4)
+        self.assertEqual(self.testGraph.componentSize(self.testUser5.UUID), 1)
+        components = sorted(self.testGraph.components(), key=len)
+        self.assertEqual(components[0], [self.testUser5.UUID])
+        self.assertEqual(set(components[1]), {self.testUser1.UUID, self.testUser2.UUID, self.testUser3.UUID, self.testUser4.UUID})
+        
+    def testInfect_many(self):
+        '''
+        seeds sharing a component, and a seed given twice
+        '''
+        users = [User(str(i), 1.0) for i in range(7)]
+        for user in users:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (3, 4), (4, 3)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        
+        seeds = [users[2].UUID, users[0].UUID, users[4].UUID, users[2].UUID, users[3].UUID]
+        attribution, total = self.testGraph.total_infection_many(seeds, 1.1)
+        self.assertEqual(total, 5)
+        self.assertEqual(attribution, {users[2].UUID: 3, users[0].UUID: 0, users[4].UUID: 2, users[3].UUID: 0})
+        self.assertEqual([user.siteVersion for user in users], [1.1] * 5 + [1.0] * 2)
+        
+        compiledAttribution, compiledTotal = self.testGraph.compile().total_infection_many(seeds, 1.2)
+        self.assertEqual((compiledAttribution, compiledTotal), (attribution, total))
+        self.assertEqual([user.siteVersion for user in users], [1.2] * 5 + [1.0] * 2)
+        
+        with self.assertRaises(GraphViolation):    #checked before any user is infected
+            self.testGraph.total_infection_many([users[5].UUID, 'unknown'], 1.3)
+        self.assertEqual(users[5].siteVersion, 1.0)
+        
     def testGetSpanningTree(self):
         '''
         graph with a loop and a branch off it
@@ -407,6 +504,56 @@ class UserGraphTest(unittest.TestCase):
         for userID, user in self.testGraph.users.items():
             self.assertEqual(user.subtreeSize, sizeDict[userID])  
         
+    def testSetSubtreeSizes_longChain(self):
+        '''
+        a coaching chain far deeper than the recursion limit
+        '''
+        chain = [User(str(i), 1.0) for i in range(5000)]
+        for user in chain:
+            self.testGraph.addUser(user)
+        for coach, coachee in zip(chain, chain[1:]):
+            self.testGraph.addCoachingRelationship(coach.UUID, coachee.UUID)
+        
+        self.testGraph.virtualRootUser = User('R')
+        self.testGraph.getSpanningTree()
+        self.testGraph.setSubtreeSizes(self.testGraph.virtualRootUser.UUID)
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 5001)
+        self.assertEqual(chain[0].subtreeSize, 5000)
+        self.assertEqual(chain[4000].subtreeSize, 1000)
+        
+    def testSetSubtreeSizes_incremental(self):
+        '''
+        relationships and users added after the sizes were computed
+        '''
+        self.testUser3 = User('III', 1.0)
+        self.testUser4 = User('IV', 1.0)
+        self.testUser5 = User('V', 1.0)
+        for user in [self.testUser1, self.testUser2, self.testUser3, self.testUser4]:
+            self.testGraph.addUser(user)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        self.testGraph.addCoachingRelationship(self.testUser3.UUID, self.testUser4.UUID)
+        
+        self.testGraph.virtualRootUser = User('R')
+        self.testGraph.users[self.testGraph.virtualRootUser.UUID] = self.testGraph.virtualRootUser
+        self.testGraph.getSpanningTree()
+        self.testGraph.setSubtreeSizes(self.testGraph.virtualRootUser.UUID)
+        
+        #attaches the 3-4 tree under 2
+        self.testGraph.addCoachingRelationship(self.testUser2.UUID, self.testUser3.UUID)
+        #a new cycle, not a tree edge
+        self.testGraph.addCoachingRelationship(self.testUser4.UUID, self.testUser1.UUID)
+        self.testGraph.addUser(self.testUser5)
+        self.testGraph.addCoachingRelationship(self.testUser4.UUID, self.testUser5.UUID)
+        
+        self.assertEqual(self.testGraph.spanningIs_coached_by[self.testUser3.UUID], self.testUser2.UUID)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[self.testUser1.UUID], self.testGraph.virtualRootUser.UUID)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[self.testUser5.UUID], self.testUser4.UUID)
+        sizes = [user.subtreeSize for user in [self.testGraph.virtualRootUser, self.testUser1, self.testUser2, self.testUser3, self.testUser4, self.testUser5]]
+        self.assertEqual(sizes, [6, 5, 4, 3, 2, 1])
+        
+        self.testGraph.setSubtreeSizes(self.testGraph.virtualRootUser.UUID)
+        self.assertEqual(sizes, [user.subtreeSize for user in [self.testGraph.virtualRootUser, self.testUser1, self.testUser2, self.testUser3, self.testUser4, self.testUser5]])
+        
     def testSelectSubtree(self):
         '''
         graph with a loop and a branch off it
@@ -453,6 +600,29 @@ class UserGraphTest(unittest.TestCase):
             rootID == self.testUser7.UUID
             )
           
+    def testSelectSubtrees(self):
+        '''
+        graph with a loop and a branch off it, several targets at once
+        '''
+        users = [User(name, 1.0) for name in ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII']]
+        for user in users:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (0, 3), (1, 4), (4, 5), (5, 6), (6, 4)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.updateSpanningTree()
+        
+        selected = self.testGraph.selectSubtrees([5, 3, 100, 4, 7, 0])
+        self.assertEqual(selected[:5], [users[1].UUID, users[4].UUID, self.testGraph.virtualRootUser.UUID, users[4].UUID, users[0].UUID])
+        self.assertIsNone(selected[5])
+        self.assertEqual(selected, [self.testGraph.selectSubtree(size) for size in [5, 3, 100, 4, 7, 0]])
+        
+        #the index follows size changes
+        extraUser = User('VIII', 1.0)
+        self.testGraph.addUser(extraUser)
+        self.testGraph.addCoachingRelationship(users[6].UUID, extraUser.UUID)
+        self.assertEqual(self.testGraph.selectSubtree(4), users[4].UUID)
+        self.assertEqual(self.testGraph.selectSubtree(8), users[0].UUID)
+        
     def testInfectSubtree_size3(self):
         '''
         graph with a loop and a branch off it
@@ -618,6 +788,306 @@ class UserGraphTest(unittest.TestCase):
         self.assertEqual(self.testUser6.siteVersion, 1.1)
         self.assertEqual(self.testUser7.siteVersion, 1.1)
 
+    def testLimitedInfection_cached(self):
+        '''
+        repeated rollouts reuse the spanning tree and never add users
+        '''
+        self.testUser3 = User('III', 1.0)
+        self.testUser4 = User('IV', 1.0)
+        for user in [self.testUser1, self.testUser2, self.testUser3]:
+            self.testGraph.addUser(user)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        
+        self.testGraph.limited_infection(1.1, 2)
+        spanningTree = self.testGraph.spanningIs_coached_by
+        self.testGraph.limited_infection(1.2, 1)
+        self.assertEqual(len(self.testGraph.users), 3)
+        self.assertIs(self.testGraph.spanningIs_coached_by, spanningTree)
+        self.assertNotIn(self.testGraph.virtualRootUser.UUID, self.testGraph.users)
+        
+        #patched rather than rebuilt
+        self.testGraph.addUser(self.testUser4)
+        self.testGraph.addCoachingRelationship(self.testUser4.UUID, self.testUser3.UUID)
+        self.assertEqual(self.testGraph.spanningGeneration, self.testGraph.generation)
+        self.testGraph.limited_infection(1.3, 2)
+        self.assertIs(self.testGraph.spanningIs_coached_by, spanningTree)
+        self.assertEqual(self.testUser4.subtreeSize, 2)
+        self.assertEqual(self.testUser3.subtreeSize, 1)
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 5)
+        self.assertEqual(self.testGraph.virtualRootUser.siteVersion, None)
+
+    def testLimitedInfectionExact(self):
+        '''
+        components of 4, 3 and 3 users: 6 is two whole components, 5 needs a subtree on top of a component
+        '''
+        users = [User(str(i), 1.0) for i in range(10)]
+        for user in users:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (0, 3), (4, 5), (5, 6), (7, 8), (8, 9), (9, 7)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        
+        self.assertEqual(self.testGraph.limited_infection_exact(1.1, 6), 6)
+        self.assertEqual(sorted(user.siteVersion for user in users), [1.0] * 4 + [1.1] * 6)
+        self.assertEqual(users[0].siteVersion, 1.0)
+        
+        self.assertEqual(self.testGraph.limited_infection_exact(1.2, 5), 5)
+        self.assertEqual(len([user for user in users if user.siteVersion == 1.2]), 5)
+        
+        self.assertEqual(self.testGraph.limited_infection_exact(1.3, 20), 10)
+        self.assertEqual({user.siteVersion for user in users}, {1.3})
+        
+    def testSelectSubtreeExact_greedyFallback(self):
+        users = [User(str(i), 1.0) for i in range(6)]
+        for user in users:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(0, 1), (1, 2), (3, 4)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.updateSpanningTree()
+        
+        rootIDs = self.testGraph.selectSubtree_exact(4, memoryBudget=0)
+        self.assertEqual(rootIDs[0], users[0].UUID)
+        self.assertEqual(sum(self.testGraph.users[ID].subtreeSize for ID in rootIDs), 4)
+
+    def testInstrumentation(self):
+        users = [User(str(i), 1.0) for i in range(5)]
+        for user in users:
+            self.testGraph.addUser(user)
+        #2 has two coaches, 3 and 4 coach each other
+        for coach, coachee in [(0, 1), (0, 2), (1, 2), (3, 4), (4, 3)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        heard = []
+        stats = self.testGraph.instrument(hook=lambda phase, seconds, counters: heard.append(phase))
+        
+        self.testGraph.limited_infection(1.1, 2)
+        self.assertEqual(heard, ['getSpanningTree', 'setSubtreeSizes', 'selectSubtree', 'infectSubtree', 'limited_infection'])
+        #every user is queued once, 2 is not queued again by its second coach
+        self.assertEqual((stats['getSpanningTree'].nodesVisited, stats['getSpanningTree'].queuePushes), (5, 5))
+        self.assertEqual((stats['getSpanningTree'].cycleRounds, stats['getSpanningTree'].peakFrontier), (1, 3))
+        self.assertEqual(stats['setSubtreeSizes'].nodesVisited, 6)
+        self.assertEqual(stats['infectSubtree'].nodesVisited, 2)
+        self.assertGreater(stats['limited_infection'].seconds, 0)
+        
+        #the cached tree is not rebuilt, so only the selection phases run again
+        self.testGraph.limited_infection(1.2, 3)
+        self.testGraph.total_infection(users[0].UUID, 1.3)
+        self.assertEqual(stats['getSpanningTree'].calls, 1)
+        self.assertEqual(stats['infectSubtree'].calls, 2)
+        self.assertEqual(stats['total_infection'].nodesVisited, 3)
+        
+        self.testGraph.uninstrument()
+        self.testGraph.total_infection(users[0].UUID, 1.4)
+        self.assertEqual(stats['total_infection'].calls, 1)
+
+    def testSpanningTree_cycleUnderRoot(self):
+        #1 and 2 coach each other, and 0 coaches 1 as well but after 2 does, so 1's first coach is in the cycle
+        users = [User(str(i), 1.0) for i in range(3)]
+        for user in users:
+            self.testGraph.addUser(user)
+        for coach, coachee in [(1, 2), (2, 1), (0, 1)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.updateSpanningTree()
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[1].UUID], users[0].UUID)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[2].UUID], users[1].UUID)
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 4)
+        
+    def testSpanningTree_manyCycles(self):
+        users = [User(str(i), 1.0) for i in range(20000)]
+        self.testGraph.addUsers(users)
+        self.testGraph.addCoachingRelationships([(users[i].UUID, users[i ^ 1].UUID) for i in range(20000)])
+        stats = self.testGraph.instrument()
+        self.testGraph.updateSpanningTree()
+        self.assertEqual(stats['getSpanningTree'].cycleRounds, 10000)
+        self.assertEqual(stats['getSpanningTree'].queuePushes, 20000)
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 20001)
+        self.assertEqual(len(self.testGraph.spanningCoaches[self.testGraph.virtualRootUser.UUID]), 10000)
+
+    def testRemoveRelationship(self):
+        users = [User(str(i), 1.0) for i in range(5)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (3, 2), (2, 4)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.addCoachingRelationship(users[0].UUID, users[1].UUID)   #already there, a no-op
+        self.assertEqual(self.testGraph.coaches[users[0].UUID], {users[1].UUID})
+        self.testGraph.updateSpanningTree()
+        componentIndex = self.testGraph.componentIndex
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[2].UUID], users[3].UUID)
+        
+        #2 is moved with its subtree under its other coach
+        self.testGraph.removeCoachingRelationship(users[3].UUID, users[2].UUID)
+        self.assertEqual(self.testGraph.spanningGeneration, self.testGraph.generation)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[2].UUID], users[1].UUID)
+        self.assertEqual([user.subtreeSize for user in users], [4, 3, 2, 1, 1])
+        self.assertEqual(self.testGraph.componentSize(users[0].UUID), 4)
+        self.assertEqual(self.testGraph.componentSize(users[3].UUID), 1)
+        self.assertNotIn(users[3].UUID, self.testGraph.coaches)
+        
+        #2 loses its last coach and hangs off the virtual root
+        self.testGraph.removeCoachingRelationship(users[1].UUID, users[2].UUID)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[2].UUID], self.testGraph.virtualRootUser.UUID)
+        self.assertEqual([user.subtreeSize for user in users], [2, 1, 2, 1, 1])
+        self.assertEqual(sorted(len(component) for component in self.testGraph.components()), [1, 2, 2])
+        self.assertIs(self.testGraph.componentIndex, componentIndex)   #repaired in place, never rebuilt
+        
+        self.testGraph.setSubtreeSizes(self.testGraph.virtualRootUser.UUID)
+        self.assertEqual([user.subtreeSize for user in users], [2, 1, 2, 1, 1])
+        with self.assertRaises(GraphViolation):
+            self.testGraph.removeCoachingRelationship(users[1].UUID, users[2].UUID)
+        
+    def testRemoveRelationship_components(self):
+        #two loops 0-1-2 and 3-4-5 joined by 2 -> 3 and 5 -> 0
+        users = [User(str(i), 1.0) for i in range(6)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (2, 3), (5, 0)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        componentIndex = self.testGraph.componentIndex
+        self.testGraph.removeCoachingRelationship(users[2].UUID, users[3].UUID)
+        self.assertEqual(self.testGraph.componentSize(users[3].UUID), 6)
+        self.testGraph.removeCoachingRelationship(users[5].UUID, users[0].UUID)
+        self.assertEqual(self.testGraph.componentSize(users[3].UUID), 3)
+        self.assertEqual(self.testGraph.total_infection(users[4].UUID, 1.1), (3, True))
+        self.assertEqual([user.siteVersion for user in users], [1.0] * 3 + [1.1] * 3)
+        self.assertIs(self.testGraph.componentIndex, componentIndex)
+        
+        #removing 1 breaks the first loop into 0 and 2
+        self.testGraph.removeUser(users[1].UUID)
+        self.assertEqual(self.testGraph.componentSize(users[0].UUID), 2)
+        self.testGraph.removeCoachingRelationship(users[2].UUID, users[0].UUID)
+        self.assertEqual(sorted(len(component) for component in self.testGraph.components()), [1, 1, 3])
+        self.assertEqual(self.testGraph.plan_total_infection(users[2].UUID), frozenset([users[2].UUID]))
+        self.assertIs(self.testGraph.componentIndex, componentIndex)
+        
+    def testRemoveRelationship_cycle(self):
+        #0 -> 1 -> 2 -> 1, removing 0 -> 1 leaves 1 and 2 in a rootless cycle
+        users = [User(str(i), 1.0) for i in range(3)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (2, 1)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.updateSpanningTree()
+        self.testGraph.removeCoachingRelationship(users[0].UUID, users[1].UUID)
+        self.assertEqual(self.testGraph.spanningIs_coached_by[users[1].UUID], self.testGraph.virtualRootUser.UUID)
+        self.assertEqual([user.subtreeSize for user in users], [1, 2, 1])
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 4)
+        
+    def testRemoveUser(self):
+        users = [User(str(i), 1.0) for i in range(4)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (1, 3)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.limited_infection(1.1, 3)
+        
+        self.testGraph.removeUser(users[1].UUID)
+        self.assertNotIn(users[1].UUID, self.testGraph.users)
+        self.assertNotIn(users[1].UUID, self.testGraph.coaches)
+        self.assertNotIn(users[1].UUID, self.testGraph.is_coached_by.get(users[2].UUID, ()))
+        self.assertEqual(users[1].name, '1')
+        self.assertEqual(users[1].siteVersion, 1.1)
+        self.assertEqual([len(component) for component in self.testGraph.components()], [1, 1, 1])
+        self.assertEqual(self.testGraph.virtualRootUser.subtreeSize, 4)
+        self.assertEqual(self.testGraph.store.ids[1], None)
+        
+        self.testGraph.limited_infection(1.2, 1)
+        self.assertEqual(sum(user.siteVersion == 1.2 for user in users), 1)
+        self.testGraph.total_infection(users[0].UUID, 1.3)
+        self.assertEqual(users[0].siteVersion, 1.3)
+        compiled = self.testGraph.compile()
+        compiled.total_infection(users[3].UUID, 1.4)
+        self.assertEqual([user.siteVersion for user in users], [1.3, 1.1, users[2].siteVersion, 1.4])
+        with self.assertRaises(GraphViolation):
+            self.testGraph.removeUser(users[1].UUID)
+        
+    def testRemove_componentsMatchSearch(self):
+        '''
+        random removals of users and relationships, the component index always agrees with a fresh search
+        '''
+        generator = random.Random(21)
+        users = [User(str(i), 1.0) for i in range(120)]
+        self.testGraph.addUsers(users)
+        self.testGraph.addCoachingRelationships(list({(users[generator.randrange(120)].UUID, users[generator.randrange(120)].UUID)
+                                                      for _ in range(150)} - {(user.UUID, user.UUID) for user in users}))
+        for step in range(60):
+            if step % 3:
+                coachID = generator.choice(sorted(self.testGraph.coaches))
+                self.testGraph.removeCoachingRelationship(coachID, generator.choice(sorted(self.testGraph.coaches[coachID])))
+            else:
+                self.testGraph.removeUser(generator.choice(sorted(self.testGraph.users)))
+            expected = {ID: frozenset(ID for ID, hops in self.testGraph._walkInfection(ID)) for ID in self.testGraph.users}
+            for component in self.testGraph.components():
+                self.assertEqual(frozenset(component), expected[component[0]])
+            for ID in self.testGraph.users:
+                self.assertEqual(self.testGraph.componentSize(ID), len(expected[ID]))
+        
+    def testRemove_searchStopsWithSmallerSide(self):
+        #one coach with 2000 students, each removal only searches around the student it cuts off
+        users = [User(str(i), 1.0) for i in range(2001)]
+        self.testGraph.addUsers(users)
+        self.testGraph.addCoachingRelationships([(users[0].UUID, student.UUID) for student in users[1:]])
+        steps = []
+        searchFrom = self.testGraph._searchFrom
+        def countingSearch(startID, reached):
+            for neighbourID in searchFrom(startID, reached):
+                steps.append(neighbourID)
+                yield neighbourID
+        self.testGraph._searchFrom = countingSearch
+        self.testGraph.removeCoachingRelationship(users[0].UUID, users[1].UUID)
+        self.testGraph.removeUser(users[2].UUID)
+        self.assertLessEqual(len(steps), 2)
+        self.assertEqual(self.testGraph.componentSize(users[0].UUID), 1999)
+        self.testGraph.removeUser(users[0].UUID)
+        self.assertEqual(sorted(len(component) for component in self.testGraph.components()), [1] * 1999)
+        
+    def testCompact(self):
+        users = [User(str(i), 1.0) for i in range(6)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (3, 4), (4, 5)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        self.testGraph.updateSpanningTree()
+        self.testGraph.removeUser(users[1].UUID)
+        self.testGraph.removeUser(users[3].UUID)
+        self.testGraph.compact()
+        store = self.testGraph.store
+        self.assertEqual((len(store), store.removed), (4, 0))
+        self.assertEqual(store.ids, [users[i].UUID for i in (0, 2, 4, 5)])
+        self.assertEqual([users[i]._slot for i in (0, 2, 4, 5)], [0, 1, 2, 3])
+        self.assertEqual(sorted(len(component) for component in self.testGraph.components()), [1, 1, 2])
+        self.assertEqual(users[4].subtreeSize, 2)
+        
+        self.testGraph.stage()
+        self.testGraph.total_infection(users[5].UUID, 1.1)
+        self.testGraph.commitStage()
+        self.assertEqual([user.siteVersion for user in users], [1.0] * 4 + [1.1] * 2)
+        self.assertEqual(self.testGraph.limited_infection_exact(1.2, 3), 3)
+        self.assertEqual(len(self.testGraph.compile()), 4)
+        self.testGraph.removeUser(users[4].UUID)
+        self.assertEqual(self.testGraph.componentSize(users[5].UUID), 1)
+        self.testGraph.compact()
+        self.assertEqual(len(self.testGraph.store), 3)
+        
+    def testPlans(self):
+        users = [User(str(i), 1.0) for i in range(6)]
+        self.testGraph.addUsers(users)
+        for coach, coachee in [(0, 1), (1, 2), (1, 3), (4, 5)]:
+            self.testGraph.addCoachingRelationship(users[coach].UUID, users[coachee].UUID)
+        ids = [user.UUID for user in users]
+        
+        totalPlan = self.testGraph.plan_total_infection(ids[2])
+        self.assertEqual(totalPlan, frozenset(ids[:4]))
+        self.assertEqual(self.testGraph.plan_total_infection(ids[2], max_hops=1), frozenset(ids[1:3]))
+        limitedPlan = self.testGraph.plan_limited_infection(3)
+        self.assertEqual(limitedPlan, frozenset(ids[1:4]))
+        self.assertEqual([user.siteVersion for user in users], [1.0] * 6)
+        self.assertIs(self.testGraph.plan_total_infection(ids[2]), totalPlan)
+        self.assertIs(self.testGraph.plan_limited_infection(3), limitedPlan)
+        
+        #versions do not change the plans
+        self.testGraph.limited_infection(1.1, 3)
+        self.assertEqual({user.UUID for user in users if user.siteVersion == 1.1}, limitedPlan)
+        self.assertIs(self.testGraph.plan_limited_infection(3), limitedPlan)
+        
+        self.testGraph.addCoachingRelationship(ids[3], ids[4])
+        self.assertEqual(self.testGraph.plan_total_infection(ids[2]), frozenset(ids))
+        self.testGraph.removeCoachingRelationship(ids[3], ids[4])
+        self.assertEqual(self.testGraph.plan_total_infection(ids[2]), totalPlan)
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'UserGraphTest.testName']
     unittest.main()
\ No newline at end of file
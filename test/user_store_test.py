@@ -0,0 +1,126 @@
+'''
+Created on Oct 18, 2026
+
+@author: Max
+'''
+import unittest
+from models.user_graph import CoachingGraph, GraphViolation, User
+
+
+class UserStoreTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.testGraph = CoachingGraph()
+        self.testUser1 = User('test user I', 1.0)
+        self.testUser2 = User('test user II')
+
+    def testUser_standalone(self):
+        self.assertEqual(self.testUser1.siteVersion, 1.0)
+        self.assertIsNone(self.testUser2.siteVersion)
+        self.testUser2.setVersion(1.1)
+        self.testUser2.subtreeSize = 3
+        self.assertEqual(self.testUser2.siteVersion, 1.1)
+        self.assertEqual(self.testUser2.subtreeSize, 3)
+        with self.assertRaises(AttributeError):
+            self.testUser1.tutors = set()   #handles have no __dict__
+
+    def testUser_attached(self):
+        self.testGraph.addUser(self.testUser1)
+        self.testGraph.addUser(self.testUser2)
+        store = self.testGraph.store
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.names, ['test user I', 'test user II'])
+        self.assertEqual(store.getVersion(self.testUser1._slot), 1.0)
+        self.assertIsNone(store.getVersion(self.testUser2._slot))
+
+        self.testUser2.setVersion(1.0)
+        self.assertEqual(list(store.versionCodes), [1, 1])  #versions are interned
+        self.testUser1.subtreeSize = 5
+        self.assertEqual(store.subtreeSizes[self.testUser1._slot], 5)
+        self.testUser1.name = 'renamed'
+        self.assertEqual(store.names[self.testUser1._slot], 'renamed')
+
+    def testSetVersions_bulk(self):
+        self.testGraph.addUser(self.testUser1)
+        self.testGraph.addUser(self.testUser2)
+        self.testGraph.store.setVersions([self.testUser1._slot, self.testUser2._slot], 1.1)
+        self.assertEqual(self.testUser1.siteVersion, 1.1)
+        self.assertEqual(self.testUser2.siteVersion, 1.1)
+
+    def testAddUser_otherGraph(self):
+        self.testGraph.addUser(self.testUser1)
+        with self.assertRaises(GraphViolation):
+            CoachingGraph().addUser(self.testUser1)
+
+    def testStagedVersions(self):
+        self.testUser3 = User('test user III', 1.0)
+        for user in [self.testUser1, self.testUser2, self.testUser3]:
+            self.testGraph.addUser(user)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        heard = []
+        self.testGraph.store.listeners.append(lambda slots, version: heard.append((list(slots), version)))
+        
+        #a plan that is thrown away
+        self.testGraph.stage()
+        self.testGraph.total_infection(self.testUser1.UUID, 1.1)
+        self.assertEqual(self.testUser2.siteVersion, 1.1)
+        self.assertEqual(self.testGraph.stagedDiff(), {(1.0, 1.1): [self.testUser1.UUID], (None, 1.1): [self.testUser2.UUID]})
+        self.testGraph.discardStage()
+        self.assertEqual([user.siteVersion for user in [self.testUser1, self.testUser2, self.testUser3]], [1.0, None, 1.0])
+        
+        #nested stages, committed all the way down
+        self.testGraph.stage()
+        self.testGraph.total_infection(self.testUser1.UUID, 1.2)
+        self.testGraph.stage()
+        self.testUser3.setVersion(1.2)
+        self.testUser1.setVersion(1.0)
+        self.assertEqual(self.testGraph.stagedDiff(), {(1.2, 1.0): [self.testUser1.UUID], (1.0, 1.2): [self.testUser3.UUID]})
+        self.testGraph.commitStage()
+        self.assertEqual(heard, [])
+        self.testGraph.commitStage()
+        self.assertEqual([user.siteVersion for user in [self.testUser1, self.testUser2, self.testUser3]], [1.0, 1.2, 1.2])
+        self.assertEqual(sorted(version for slots, version in heard), [1.0, 1.2])
+        self.assertEqual(sum(len(slots) for slots, version in heard), 3)
+        self.assertEqual(self.testGraph.store.layers, [])
+
+    def testVersionIndex(self):
+        self.testUser3 = User('test user III', 1.0)
+        self.testGraph.addUsers([self.testUser1, self.testUser2])
+        self.assertIsNone(self.testGraph.store.versionSlots)  #built on the first query
+        self.assertEqual(self.testGraph.countVersion(1.0), 1)
+        self.assertEqual(self.testGraph.versionCounts(), {1.0: 1, None: 1})
+        
+        self.testGraph.addUser(self.testUser3)
+        self.testGraph.addCoachingRelationship(self.testUser1.UUID, self.testUser2.UUID)
+        self.testGraph.total_infection(self.testUser1.UUID, 1.1)
+        self.assertEqual(self.testGraph.versionCounts(), {1.0: 1, 1.1: 2})
+        self.assertEqual(set(self.testGraph.usersOnVersion(1.1)), {self.testUser1.UUID, self.testUser2.UUID})
+        self.testUser1.setVersion(1.2)
+        self.assertEqual(self.testGraph.countVersion(1.1), 1)
+        self.assertEqual(self.testGraph.countVersion(1.2), 1)
+        self.assertEqual(self.testGraph.countVersion(2.0), 0)
+        self.assertEqual(self.testGraph.usersOnVersion(2.0), [])
+        
+        #staged versions are counted, and nothing is left behind when they are discarded
+        self.testGraph.stage()
+        self.testGraph.total_infection(self.testUser1.UUID, 2.0)
+        self.testUser3.setVersion(1.1)
+        self.assertEqual(self.testGraph.versionCounts(), {2.0: 2, 1.1: 1})
+        self.assertEqual(self.testGraph.usersOnVersion(1.1), [self.testUser3.UUID])
+        self.testGraph.discardStage()
+        self.assertEqual(self.testGraph.versionCounts(), {1.0: 1, 1.1: 1, 1.2: 1})
+        self.testGraph.stage()
+        self.testUser3.setVersion(1.2)
+        self.testGraph.commitStage()
+        self.assertEqual(self.testGraph.versionCounts(), {1.1: 1, 1.2: 2})
+        
+        self.testGraph.removeUser(self.testUser1.UUID)
+        self.assertEqual(self.testGraph.versionCounts(), {1.1: 1, 1.2: 1})
+        self.assertEqual(self.testUser1.siteVersion, 1.2)
+        self.testUser1.setVersion(1.3)  #detached users keep working standalone
+        self.assertEqual(self.testGraph.countVersion(1.3), 0)
+        self.assertEqual(self.testGraph.compile().usersOnVersion(1.2), [self.testUser3.UUID])
+
+if __name__ == "__main__":
+    unittest.main()